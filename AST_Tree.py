@@ -1,215 +1,363 @@
-from typing import List, Optional
-from lexer import Lexer, TokenType
-from parser import Parser
+from bisect import bisect_left, bisect_right
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+from errors import ParserError
+from lexer import Lexer, LineIndex, common_prefix, common_suffix, scan
+from parser import COLUMN_BITS, COLUMN_MASK, Parser
+from traversal import preorder
 # cspell: ignore MULT_OP
 
-# AST node (kind, value, children)
+# kinds of AST node -- one small int per node instead of a string.
+# a kind prints as its name, so visit_<kind> methods and messages read the same as before
+class NodeKind(IntEnum):
+    Program = 1
+    Assign = 2
+    Var = 3
+    Int = 4
+    String = 5
+    BinOp = 6
+    UnaryOp = 7
+    LogicOp = 8
+    RelOp = 9
+    If = 10
+    Loop = 11
+    Print = 12
+
+    def __str__(self) -> str:
+        return self.name
+
+KINDS = {kind.name: kind for kind in NodeKind} # name -> kind, so nodes can still be made from strings
+KINDS.update({kind: kind for kind in NodeKind})
+LEAF = () # children of every leaf node, shared
+
+# AST node (kind, value, children) -- an Int node's value is decoded to an int once, when it is parsed.
+# start / end are where the node is in the source, packed as line << COLUMN_BITS | column (columns from 1,
+# 0 when unknown). Lines are relative, so the nodes IncrementalParser shares after an edit stay right:
+#   a statement's start line counts from the statement before it in its list, or from the if / loop / program
+#   owning the list if it is the first one
+#   any other node's start line counts from the line of the statement it is in
+#   the end line counts from the node's own start line, the end column is one past its last character
+# the program node's start is absolute. A walk over a statement list adds up the lines as it goes, so it always
+# knows the absolute line of the statement it is on (see StatementRunner)
 class ASTNode:
-    def __init__(self, kind: str, value: Optional[str] = None, children: Optional[List['ASTNode']] = None):
-        self.kind: str = kind
-        self.value: Optional[str] = value
-        self.children: List[ASTNode] = children or []
+    __slots__ = ("kind", "value", "children", "start", "end")
+
+    def __init__(self, kind, value=None, children=None, start=0, end=0):
+        self.kind: NodeKind = KINDS[kind]
+        self.value = value
+        self.children = children if children is not None else LEAF
+        self.start = start
+        self.end = end
 
     # check if the node is a literal (int / string) or an identifier (var)
     def __repr__(self) -> str:
         # if it has a value, return it with the kind or just return kind
-        return f"{self.kind}('{self.value}')" if self.value is not None else self.kind
+        return f"{self.kind}('{self.value}')" if self.value is not None else self.kind.name
+
+# (line, column) of a packed position
+def unpack(position: int) -> Tuple[int, int]:
+    return position >> COLUMN_BITS, position & COLUMN_MASK
+
+# node moved down by lines -- a copy, so trees sharing it keep it where it was
+def moved(node: ASTNode, lines: int) -> ASTNode:
+    if not lines:
+        return node
+    return ASTNode(node.kind, node.value, node.children, node.start + (lines << COLUMN_BITS), node.end)
+
+# expression kinds -- evaluating them has no side effects, so one node can stand for every copy of a subtree
+PURE_KINDS = frozenset({NodeKind.Var, NodeKind.Int, NodeKind.String, NodeKind.BinOp, NodeKind.UnaryOp,
+                        NodeKind.LogicOp, NodeKind.RelOp})
+
+# node factory for hash-consing: an expression node identical to one made before is that node, so repeated
+# subexpressions (i % 3, x + 1) are stored once and keep one identity, for per-subexpression caches to key on.
+# identical means same kind, value, children (already shared, so compared by identity) and start line within the
+# statement -- error lines stay exact, the column of a shared node is the one of its first occurrence.
+# statements are always new nodes, their positions are rewritten by the parser
+class NodeInterner:
+    def __init__(self):
+        self.table: Dict[tuple, ASTNode] = {} # (kind, value, line, child ids) -> the shared node
+        self.requested = 0 # expression nodes the parser asked for
+
+    def __call__(self, kind, value=None, children=None, start=0, end=0) -> ASTNode:
+        kind = KINDS[kind]
+        if kind not in PURE_KINDS:
+            return ASTNode(kind, value, children, start, end)
+        self.requested += 1
+        key = (kind, value, start >> COLUMN_BITS, *map(id, children)) if children else (kind, value, start >> COLUMN_BITS)
+        node = self.table.get(key)
+        if node is None:
+            node = self.table[key] = ASTNode(kind, value, children, start, end)
+        return node
 
-# AST Parser -- parse tokens from the lexer to construct the AST
+    # expression nodes asked for per node made -- 1.0 when nothing was shared
+    def ratio(self) -> float:
+        return self.requested / len(self.table) if self.table else 1.0
+
+    # the deduplication, as text
+    def report(self) -> str:
+        unique = len(self.table)
+        saved = 1 - unique / self.requested if self.requested else 0
+        return (f"{self.requested:,} expression nodes, {unique:,} unique: "
+                f"{self.ratio():.2f}x deduplication, {saved:.0%} fewer nodes")
+
+# AST Parser -- the parser's grammar engine in build mode, returns the AST from parse()
+# with hash_cons=True identical side-effect-free subtrees share one node (see NodeInterner), self.interner has the counts
 class ASTParser(Parser):
     # initialize parser with tokens
-    def parse(self) -> ASTNode:
-        return self.program() # start from program node and return the AST
-
-    # <program> -> program <statements> end_program
-    def program(self) -> ASTNode:
-        self.match(TokenType.PROGRAM) # match the 'program' keyword
-        stmts = self.statements() # parse the statements in the program
-        self.match(TokenType.END_P) # match the 'end_program' keyword
-        return ASTNode('Program', 'program', stmts) # return the program node with its statements.
-    
-    # multiple statements
-    # <statements> -> <statement> <statements> | <empty>
-    def statements(self) -> List[ASTNode]:
-        nodes: List[ASTNode] = []
-        # while there are more tokens and the current token is not an END_P, END_IF, or END_LOOP
-        while self.current_token and self.current_token.token_type not in (TokenType.END_P, TokenType.END_IF, TokenType.END_LOOP):
-            nodes.append(self.statement()) # parse a statement and add it to the list of nodes
-        return nodes # return the nodes
-
-    # single statement
-    # <statement> -> <assignment> | <if_statement> | <loop_statement> | <print_statement>
-    def statement(self) -> ASTNode:
-        # figure out the type of statement to parse (IF, LOOP, PRINT)
-        if self.current_token.token_type == TokenType.IF_STMT:
-            return self.if_statement()
-        if self.current_token.token_type == TokenType.LOOP:
-            return self.loop_statement()
-        if self.current_token.token_type == TokenType.PRINT:
-            return self.print_statement()
-        # or parse an assignment statement
-        return self.assignment()
-
-    # <print_statement> -> PRINT '(' <expr> ')' SEMI
-    def print_statement(self) -> ASTNode:
-        self.match(TokenType.PRINT) # match the PRINT keyword
-        self.match(TokenType.LEFT_PAREN) # match the LEFT_PAREN token
-        expr_node = self.expr() # parse the expression inside the parentheses
-        self.match(TokenType.RIGHT_PAREN) # match the RIGHT_PAREN token
-        self.match(TokenType.SEMI) # match the SEMI token
-        return ASTNode('Print', "print", [expr_node]) # return the print node & expression
-
-    # <assignment> -> <var> '=' <expr> SEMI
-    def assignment(self) -> ASTNode:
-        var = ASTNode('Var', self.current_token.lexeme) # create a var node with the current token's lexeme
-        self.match(TokenType.IDENT) # match an identifier
-        self.match(TokenType.ASSIGN_OP) # match an ASSIGN_OP
-        expr_node = self.expr() # parse the expression
-        self.match(TokenType.SEMI) # match the SEMI
-        return ASTNode('Assign', "=", [var, expr_node]) # return the assignment node with the var and expression
-
-    # <if_statement> -> IF_STMT '(' <logic_expr> ')' <statements> END_IF
-    def if_statement(self) -> ASTNode:
-        # match tokens, parse expressions/statements
-        self.match(TokenType.IF_STMT)
-        self.match(TokenType.LEFT_PAREN)
-        cond = self.logic_expr()
-        self.match(TokenType.RIGHT_PAREN)
-        body = self.statements()
-        self.match(TokenType.END_IF)
-        return ASTNode('If', "if", [cond] + body) # return the if statement node
-
-    # <loop_statement> -> LOOP '(' <var> '=' (<INT_LIT>|<var>) ':' (<INT_LIT>|<var>) ')' <statements> END_LOOP
-    def loop_statement(self) -> ASTNode:
-        self.match(TokenType.LOOP) # match tokens
-        self.match(TokenType.LEFT_PAREN)
-        var = ASTNode('Var', self.current_token.lexeme) # create a var with current token's lexeme
-        self.match(TokenType.IDENT) # match tokens
-        self.match(TokenType.ASSIGN_OP)
-        start = (ASTNode('Int', self.current_token.lexeme)
-                 if self.current_token.token_type == TokenType.INT_LIT
-                 else ASTNode('Var', self.current_token.lexeme)) # create start node with the current token's lexeme
-        self.match(self.current_token.token_type) # match the token type (either INT_LIT or variable) -- RANGE 1
-        self.match(TokenType.COLON) # match token
-        end = (ASTNode('Int', self.current_token.lexeme)
-               if self.current_token.token_type == TokenType.INT_LIT
-               else ASTNode('Var', self.current_token.lexeme)) # create end node with the current token's lexeme
-        self.match(self.current_token.token_type) # match the token type (either INT_LIT or variable) -- RANGE 2
-        self.match(TokenType.RIGHT_PAREN) # match token
-        body = self.statements() # parse the statements inside the loop
-        self.match(TokenType.END_LOOP) # match token
-        return ASTNode('Loop', "loop", [var, start, end] + body) # return the loop node
-
-    # <logic_expr> -> <rel_expr> { (LOGICAL_AND | LOGICAL_OR) <rel_expr> } | ( <logic_expr> )
-    def logic_expr(self) -> ASTNode:
-        # if the current token is a LEFT_PAREN, match it
-        if self.current_token.token_type == TokenType.LEFT_PAREN:
-            self.match(TokenType.LEFT_PAREN)
-            node = self.logic_expr() # parse the logic expression inside
-            self.match(TokenType.RIGHT_PAREN) # match the RIGHT_PAREN token
-        else:
-            node = self.rel_expr() # else just parse a relational expression
-
-        # while there are more tokens and the current token is a logical operator (ie: AND, OR)
-        while self.current_token and self.current_token.token_type in (TokenType.LOGICAL_AND, TokenType.LOGICAL_OR):
-            op = self.current_token.lexeme # get the current token's lexeme as the operator
-            self.advance() # advance to the next token
-            right = self.logic_expr() # parse the next logic expression recursively
-            node = ASTNode('LogicOp', op, [node, right]) # create the node
-        return node # return the node
-
-    # <rel_expr> -> <expr> <rel_op> <expr>
-    #   rel_op = (==, !=, >, <, >=, <=)
-    def rel_expr(self) -> ASTNode:
-        left = self.expr() # parse left
-        op = self.current_token.lexeme # get the current token's lexeme as the operator
-        self.rel_op() # match token
-        right = self.expr() # parse right
-        return ASTNode('RelOp', op, [left, right]) # create the node
-
-
-    # <rel_op> -> == | != | > | < | >= | <=
-    def rel_op(self) -> None:
-        # check if the current token is a relational operator
-        if self.current_token and self.current_token.token_type in (
-            TokenType.EQUALS, TokenType.NOT_EQUALS, TokenType.GREATER_THAN,
-            TokenType.LESS_THAN, TokenType.GREATER_EQ, TokenType.LESS_EQ
-        ):
-            self.advance() # advance to next token
-        # else -- error
-        else:
-            self.error("Expecting relational operator")
-
-    # <expr> -> <term> { (ADD_OP | SUB_OP) <term> }
-    def expr(self) -> ASTNode:
-        node = self.term() # parse term
-        # while there are more tokens and the current token is an addition or subtraction operator
-        while self.current_token and self.current_token.token_type in (TokenType.ADD_OP, TokenType.SUB_OP):
-            op = self.current_token.lexeme # get the current token's lexeme as the operator
-            self.advance() # advance
-            right = self.term() # parse term
-            node = ASTNode('BinOp', op, [node, right]) # create node
-        return node # return the node
-
-    # <term> -> <factor> { (MULT_OP | DIV_OP | MOD_OP) <factor> }
-    def term(self) -> ASTNode:
-        node = self.factor() # parse the node
-        # while there are more tokens and the current token is a multiplication, division, or modulo operator
-        while self.current_token and self.current_token.token_type in (TokenType.MULT_OP, TokenType.DIV_OP, TokenType.MOD_OP):
-            op = self.current_token.lexeme # get the current token's lexeme as the operator
-            self.advance() # advance
-            right = self.factor() # parse
-            node = ASTNode('BinOp', op, [node, right]) # create the node
-        return node # return the node
-
-    # <factor> -> <unary> | <var> | <INT_LIT> | <STRING_LIT> | ( <expr> )
-    def factor(self) -> ASTNode:
-        # parse and operate on tokens
-        if self.current_token.token_type == TokenType.SUB_OP:
-            self.advance() # advance
-            node = self.factor() # parse
-            return ASTNode('UnaryOp', '-', [node]) # return the node
-        if self.current_token.token_type == TokenType.IDENT:
-            node = ASTNode('Var', self.current_token.lexeme)
-            self.advance()
-            return node
-        if self.current_token.token_type == TokenType.STRING_LIT:
-            node = ASTNode('String', self.current_token.lexeme[1:-1])
-            self.advance()
-            return node
-        if self.current_token.token_type == TokenType.INT_LIT:
-            node = ASTNode('Int', self.current_token.lexeme)
-            self.advance()
-            return node
-        if self.current_token.token_type == TokenType.LEFT_PAREN:
-            self.advance()
-            node = self.expr()
-            self.match(TokenType.RIGHT_PAREN)
-            return node
-        # else -- error
-        self.error("Expecting identifier, integer, unary '-', or '('") # else raise an error
+    def __init__(self, tokens, source_code=None, line_index=None, recover=False, hash_cons=False):
+        super().__init__(tokens, source_code, line_index, build=True, recover=recover)
+        self.interner: Optional[NodeInterner] = None
+        if hash_cons:
+            self.make_node = self.interner = NodeInterner()
+
+
+# the statements of one statement list -- the program body, or the body of an if / loop -- and where each one is.
+# positions are relative to the statement that owns the list, so an edit only moves what comes after it
+class Block:
+    __slots__ = ("nodes", "starts", "ends", "first_lines", "last_lines", "blocks",
+                 "open_end", "open_line", "close_start", "close_line")
+
+    def __init__(self):
+        self.nodes: List[ASTNode] = [] # the statement nodes
+        self.starts: List[int] = [] # offset of each statement's first token
+        self.ends: List[int] = [] # offset just past its last token
+        self.first_lines: List[int] = [] # line of its first token
+        self.last_lines: List[int] = [] # line of its last token
+        self.blocks: List[Optional[Block]] = [] # the body of an if / loop statement, else None
+        self.open_end = 0 # end of the token before the list ('program', or the ')' of an if / loop header)
+        self.open_line = 0
+        self.close_start = 0 # start of the token after the list (end_program / end_if / end_loop)
+        self.close_line = 0
+
+    # make every position relative to (start, line)
+    def rebase(self, start: int, line: int) -> None:
+        self.starts = [offset - start for offset in self.starts]
+        self.ends = [offset - start for offset in self.ends]
+        self.first_lines = [number - line for number in self.first_lines]
+        self.last_lines = [number - line for number in self.last_lines]
+        self.open_end -= start
+        self.open_line -= line
+        self.close_start -= start
+        self.close_line -= line
+
+    # move the statements from index on, and the closing token, by chars / lines
+    def shift(self, index: int, chars: int, lines: int) -> None:
+        if chars:
+            self.starts[index:] = [offset + chars for offset in self.starts[index:]]
+            self.ends[index:] = [offset + chars for offset in self.ends[index:]]
+            self.close_start += chars
+        if lines:
+            self.first_lines[index:] = [number + lines for number in self.first_lines[index:]]
+            self.last_lines[index:] = [number + lines for number in self.last_lines[index:]]
+            self.close_line += lines
+
+
+# ASTParser that also records a Block for every statement list it parses
+class SpanParser(ASTParser):
+    def __init__(self, tokens, source_code=None, line_index=None):
+        self.levels: List[Block] = [] # the lists being parsed, innermost last
+        self.body: Optional[Block] = None # the list parsed last
+        super().__init__(tokens, source_code, line_index)
+
+    # the last token consumed
+    def previous(self):
+        index = self.index - (1 if self.current_token is None else 2)
+        return self.tokens[index] if index >= 0 else None
+
+    # a statement list starts -- record it in a new Block
+    def open_list(self):
+        block = Block()
+        opener = self.previous()
+        if opener is not None:
+            block.open_end = opener.start + len(opener.lexeme)
+            block.open_line = opener.line
+        self.levels.append(block)
+
+    # the list ends -- its Block is kept in self.body
+    def close_list(self):
+        block = self.body = self.levels.pop()
+        closer = self.current_token
+        if closer is not None:
+            block.close_start = closer.start
+            block.close_line = closer.line
+
+    # a statement was parsed -- add it to its list with its position
+    def close_statement(self, node, first):
+        last = self.previous()
+        body, self.body = self.body, None # the list closed just before it is its body, if it has one
+        # the body of an if / loop is kept relative to the statement
+        if body is not None:
+            body.rebase(first.start, first.line)
+        level = self.levels[-1]
+        level.nodes.append(node)
+        level.starts.append(first.start)
+        level.ends.append(last.start + len(last.lexeme))
+        level.first_lines.append(first.line)
+        level.last_lines.append(last.line)
+        level.blocks.append(body)
+
+
+# keeps the AST of the last parse, and after an edit re-parses only the statements on the lines that changed:
+# the smallest run of statements, inside the innermost if / loop body holding the edit, is parsed again and
+# spliced in. The nodes on the path to it are copied, everything else is shared with the previous tree
+class IncrementalParser:
+    def __init__(self):
+        self.source: Optional[str] = None # source of the current tree
+        self.tree: Optional[ASTNode] = None
+        self.top: Optional[Block] = None # the program body
+        self.reparsed: Optional[Tuple[int, int]] = None # lines the last update re-parsed, None after a full parse
+
+    # the AST of source -- raises ParserError on syntax errors
+    def parse(self, source: str) -> ASTNode:
+        if self.tree is not None:
+            if source == self.source:
+                return self.tree
+            tree = self.splice(source)
+            if tree is not None:
+                return tree
+        return self.full(source)
+
+    # parse everything
+    def full(self, source: str) -> ASTNode:
+        self.source = self.tree = self.top = self.reparsed = None # nothing to reuse if this raises
+        lexer = Lexer(source)
+        parser = SpanParser(lexer.get_tokens(), source, lexer.line_index)
+        tree = parser.parse()
+        self.source, self.tree, self.top = source, tree, parser.body
+        return tree
+
+    # the statements of block on lines first..last -- (i, j, first line, last line) of the run to re-parse.
+    # the run takes whole lines, so it can be lexed on its own. None if the edit is not inside this list
+    def run(self, block: Block, first: int, last: int) -> Optional[Tuple[int, int, int, int]]:
+        # the edit must be clear of the lines of the tokens around the list
+        if first <= block.open_line or last >= block.close_line:
+            return None
+        count = len(block.nodes)
+        i = bisect_left(block.last_lines, first) # first statement ending on or after the edit
+        j = bisect_right(block.first_lines, last) # first statement starting after it
+        # statements sharing a line with the run belong to it
+        while True:
+            low = block.last_lines[i - 1] + 1 if i > 0 else block.open_line + 1
+            high = block.first_lines[j] - 1 if j < count else block.close_line - 1
+            if i < j and low > block.first_lines[i]:
+                if i == 0:
+                    return None # shares a line with 'program' or a block header
+                i -= 1
+            elif i < j and high < block.last_lines[j - 1]:
+                if j == count:
+                    return None # shares a line with the closing token
+                j += 1
+            else:
+                return i, j, low, high
+
+    # re-parse only around the edit -- None if it has to be a full parse
+    def splice(self, source: str) -> Optional[ASTNode]:
+        old = self.source
+        prefix = common_prefix(old, source)
+        suffix = common_suffix(old, source, min(len(old), len(source)) - prefix)
+        end = len(old) - suffix # the edit replaced old[prefix:end]
+        chars = len(source) - len(old)
+        first = old.count("\n", 0, prefix) + 1 # lines the edit touched, in the old text
+        last = first + old.count("\n", prefix, end)
+        lines = source.count("\n", prefix, end + chars) - (last - first)
+
+        # walk down to the innermost statement list holding the edit
+        path = [] # (list, index of the statement owning the next list, its offset, its line)
+        block, base, base_line = self.top, 0, 0
+        found = None
+        while True:
+            run = self.run(block, first - base_line, last - base_line)
+            if run is None:
+                break
+            found = (block, base, base_line, run, len(path))
+            i, j = run[0], run[1]
+            # one if / loop statement -- try its body
+            if j - i != 1 or block.blocks[i] is None:
+                break
+            path.append((block, i, base, base_line))
+            base += block.starts[i]
+            base_line += block.first_lines[i]
+            block = block.blocks[i]
+        if found is None:
+            return None
+        block, base, base_line, (i, j, low, high), depth = found
+        del path[depth:]
+
+        # the whole lines of the run, in the new text
+        anchor = base + (block.ends[i - 1] if i > 0 else block.open_end) # before the edit
+        start = source.find("\n", anchor) + 1
+        anchor = base + (block.starts[j] if j < len(block.nodes) else block.close_start) + chars # after it
+        stop = source.rfind("\n", 0, anchor)
+        tokens = list(scan(source[start:stop], low + base_line, start))
+        parser = SpanParser(tokens, line_index=LineIndex(source, start, stop, low + base_line))
+        try:
+            nodes = parser.statements()
+        except ParserError:
+            return None
+        if parser.current_token is not None:
+            return None # e.g. an end_if typed into the run
+        fragment = parser.body
+        fragment.rebase(base, base_line)
+
+        # splice the new statements in, and move everything after them
+        count = len(block.nodes)
+        block.nodes[i:j] = nodes
+        block.starts[i:j] = fragment.starts
+        block.ends[i:j] = fragment.ends
+        block.first_lines[i:j] = fragment.first_lines
+        block.last_lines[i:j] = fragment.last_lines
+        block.blocks[i:j] = fragment.blocks
+        block.shift(i + len(nodes), chars, lines)
+        for parent, index, _, _ in path:
+            parent.ends[index] += chars
+            parent.last_lines[index] += lines
+            parent.shift(index + 1, chars, lines)
+
+        # node lines count from the statement before (see ASTNode) -- set the first new statement's, and the next one's
+        owner_line = 0 if path else self.tree.start >> COLUMN_BITS # the top list's lines are absolute
+        for index in (i, i + len(nodes)):
+            if index < len(block.nodes):
+                node = block.nodes[index]
+                previous = block.first_lines[index - 1] if index > 0 else owner_line
+                block.nodes[index] = moved(node, block.first_lines[index] - previous - (node.start >> COLUMN_BITS))
+
+        # copy the owners of the changed lists, from the innermost up to the program
+        owners = [self.tree] + [parent.nodes[index] for parent, index, _, _ in path]
+        node = owners[-1]
+        grown = lines << COLUMN_BITS # the owners end that many lines further down
+        node = ASTNode(node.kind, node.value, list(node.children[:len(node.children) - count]) + block.nodes, node.start, node.end + grown)
+        for (parent, index, _, _), owner in zip(reversed(path), reversed(owners[:-1])):
+            parent.nodes[index] = node
+            if index + 1 < len(parent.nodes):
+                parent.nodes[index + 1] = moved(parent.nodes[index + 1], lines)
+            node = ASTNode(owner.kind, owner.value, list(owner.children[:len(owner.children) - len(parent.nodes)]) + parent.nodes,
+                           owner.start, owner.end + grown)
+        self.source, self.tree = source, node
+        self.reparsed = (low + base_line, high + base_line + lines)
+        return node
+
 
 # print the AST tree
 def print_tree(node: ASTNode, indent: int = 10) -> None:
-    def _print(node: ASTNode, prefix: str = "", is_last: bool = True) -> None:
+    prefixes = [""] # prefix for the children of the node at each depth on the current path
+    for node, depth, is_last in preorder(node):
+        del prefixes[depth + 1:]
+        prefix = prefixes[depth]
         connector = "└── " if is_last else "├── "
         print(" " * indent + prefix + connector + repr(node))
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        for i, child in enumerate(node.children):
-            _print(child, new_prefix, i == len(node.children) - 1)
-    _print(node)
+        prefixes.append(prefix + ("    " if is_last else "│   "))
 
 if __name__ == '__main__':
     import sys
     if len(sys.argv) != 2:
         print('Usage: python ast_tree.py <source-file>')
         sys.exit(1)
-    src = open(sys.argv[1]).read()    # read the source code from the file
-    tokens = Lexer(src).get_tokens()  # tokenize the source code
-    parser = ASTParser(tokens, src)   # create a parser instance
-    # try to parse the tokens and create the AST
-    try:
-        tree = parser.parse()
-        print_tree(tree)
-    except Exception as e:
-        print(e) # print errors
+    # stream the tokens straight from the file
+    with open(sys.argv[1]) as src:
+        parser = ASTParser(Lexer.iter_tokens(src)) # create a parser instance
+        # try to parse the tokens and create the AST
+        try:
+            tree = parser.parse()
+            print_tree(tree)
+        except Exception as e:
+            print(e) # print errors
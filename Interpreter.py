@@ -1,62 +1,87 @@
-from typing import Any, Generator, Tuple, List, Dict
-from AST_Tree import ASTNode
+from typing import Any, Generator, Iterable, Iterator, Optional, Sequence, Tuple, List, Dict
+from AST_Tree import COLUMN_BITS, PURE_KINDS, ASTNode, NodeKind, unpack
 from errors import InterpreterError
+from traversal import Evaluator, StatementRunner, trampoline
 
 class Interpreter:
     def __init__(self, debug: bool = False) -> None:
         self.variables: Dict[str, Any] = {} # dictionary for values of variables
         self.output: List[Any] = [] # list to store output values
         self.debug: bool = debug # enable/disable debug
+        self.error: Exception = None # what the last interpret() failed with
+        # visitor methods looked up once per node kind, not once per visited node
+        generic_visit = self.generic_visit
+        self.visitors = {kind: getattr(self, f"visit_{kind}", generic_visit) for kind in NodeKind}
+        self.step_visitors = {kind: getattr(self, f"step_visit_{kind}", self.generic_step_visit) for kind in NodeKind}
+        # expressions are evaluated on a value stack, statements run from a stack of statement lists -- no recursion
+        self.evaluator = Evaluator({kind: self.visitors[kind] for kind in PURE_KINDS}, generic_visit)
+        self.value_of = self.evaluator.evaluate # the value of an expression
+        self.runner = StatementRunner(self.visitors)
 
     # interpreter -- evaluates AST generated by the parser and executes the program.
     def interpret(self, node: ASTNode) -> Tuple[str, List[Any], Dict[str, Any]]:
         self.output.clear()
+        self.error = None
         try:
             self.visit(node) # start from the root
             return "success", self.output, self.variables # if success, return status, output, and variables
         except Exception as e:
+            self.error = e # keeps the line and column of an InterpreterError
             return f"fail: {str(e)}", self.output, self.variables # if error, return fail status with message
 
-    # visit -- find the correct visitor method based on node
+    # visit -- evaluate an expression, or run a statement (a program, usually)
     def visit(self, node: ASTNode) -> Any:
-        method_name = f'visit_{node.kind}' # create the method name based on the node kind
-        visitor = getattr(self, method_name, self.generic_visit) # get the method or use the generic_visit if not found
-        return visitor(node) # return the result of the visitor method
+        if node.kind in PURE_KINDS:
+            return self.value_of(node)
+        try:
+            self.runner.run((node,))
+        except InterpreterError as error:
+            # the runner stopped at the failing statement, the error's line is relative to it
+            if node.kind == NodeKind.Program:
+                error.anchor(self.runner.line)
+            else:
+                error.shift(self.runner.line - (node.start >> COLUMN_BITS)) # relative to node
+            raise
+
+    # an InterpreterError at node -- its line is relative to the node's statement until the error is anchored
+    # at the line of the statement that was running (so locating an error costs nothing until one is raised)
+    def fail(self, message: str, node: ASTNode) -> InterpreterError:
+        line, column = unpack(node.start)
+        return InterpreterError(message, line, column, relative=True)
 
     # generic visit -- handles nodes that do not have a specific visitor method
-    def generic_visit(self, node: ASTNode) -> Any:
-        raise InterpreterError(f"No method visit_{node.kind}") # raise an exception if no specific visitor method is found
+    def generic_visit(self, node: ASTNode, *values: Any) -> Any:
+        raise self.fail(f"No method visit_{node.kind}", node) # raise an exception if no specific visitor method is found
 
 # visitor methods for each node type
-    # visit the program node
-    def visit_Program(self, node: ASTNode) -> None:
-        for child in node.children:
-            self.visit(child) # visit each child
+    # statements return the statement lists to run inside them, expressions get the values of their children
+
+    # visit the program node -- its statements
+    def visit_Program(self, node: ASTNode) -> Iterable[Sequence[ASTNode]]:
+        return (node.children,)
 
     # visit assignment nodes
     def visit_Assign(self, node: ASTNode) -> None:
         var_name = node.children[0].value # get the variable name from the first child node
-        value = self.visit(node.children[1]) # visit the expression node to get its value
+        value = self.value_of(node.children[1]) # evaluate the expression node to get its value
         self.variables[var_name] = value # assign the value in the dictionary
 
     # visit variable nodes to get their value
     def visit_Var(self, node: ASTNode) -> Any:
         if node.value not in self.variables:
-            raise InterpreterError(f"Runtime Error: Variable '{node.value}' not assigned.") # if the variable is not assigned, error
+            raise self.fail(f"Runtime Error: Variable '{node.value}' not assigned.", node) # if the variable is not assigned, error
         return self.variables[node.value] # else return the value of the var
 
     # visit string literal nodes to return their value
     def visit_String(self, node: ASTNode) -> str:
         return node.value
 
-    # visit integer literal nodes and return them as integers
+    # visit integer literal nodes and return them -- decoded when parsed
     def visit_Int(self, node: ASTNode) -> int:
-        return int(node.value)
+        return node.value
 
     # visit binary operation nodes to get the result of the operation
-    def visit_BinOp(self, node: ASTNode) -> Any:
-        left = self.visit(node.children[0]) # visit left operand
-        right = self.visit(node.children[1]) # visit right operand
+    def visit_BinOp(self, node: ASTNode, left: Any, right: Any) -> Any:
         op = node.value # get the operator value 
         # handle different operators
         if op == '+':
@@ -68,27 +93,23 @@ class Interpreter:
         # handle division by zero error
         if op == '/':
             if right == 0:
-                raise InterpreterError("Runtime Error: Division by zero.")
+                raise self.fail("Runtime Error: Division by zero.", node)
             return left // right
         if op == '%':
             return left % right
-        raise InterpreterError(f"Unknown operator: {op}")
+        raise self.fail(f"Unknown operator: {op}", node)
 
     # visit logical operation nodes to get the result of the operation
-    def visit_LogicOp(self, node: ASTNode) -> bool:
-        left = self.visit(node.children[0]) # visit left operand
-        right = self.visit(node.children[1]) # visit right operand
+    def visit_LogicOp(self, node: ASTNode, left: Any, right: Any) -> bool:
         # handle cases for different operators
         if node.value == '&&':
             return left and right
         if node.value == '||':
             return left or right
-        raise InterpreterError(f"Unknown logic operator: {node.value}")
+        raise self.fail(f"Unknown logic operator: {node.value}", node)
 
     # visit relational operation nodes to get the result of the operation
-    def visit_RelOp(self, node: ASTNode) -> bool:
-        left = self.visit(node.children[0]) # visit left operand
-        right = self.visit(node.children[1]) # visit right operand
+    def visit_RelOp(self, node: ASTNode, left: Any, right: Any) -> bool:
         # handle the cases for different operators
         if node.value == '==':
             return left == right
@@ -102,34 +123,33 @@ class Interpreter:
             return left >= right
         if node.value == '<=':
             return left <= right
-        raise InterpreterError(f"Unknown relational operator: {node.value}")
+        raise self.fail(f"Unknown relational operator: {node.value}", node)
 
     # visit if statement nodes to evaluate the condition
-    def visit_If(self, node: ASTNode) -> None:
-        condition = self.visit(node.children[0]) # get the value of the condition node
-        # if true, visit each statement in body of the if()
+    def visit_If(self, node: ASTNode) -> Optional[Iterable[Sequence[ASTNode]]]:
+        condition = self.value_of(node.children[0]) # get the value of the condition node
+        # if true, run the body of the if()
         if condition:
-            for stmt in node.children[1:]:
-                self.visit(stmt)
+            return (node.children[1:],)
+        return None
 
     # visit loop statement nodes to evaluate the loop variable and its range
-    def visit_Loop(self, node: ASTNode) -> None:
+    def visit_Loop(self, node: ASTNode) -> Iterator[Sequence[ASTNode]]:
         loop_var = node.children[0].value # get the loop variable name
-        start = self.visit(node.children[1]) # visit start to get its value
-        end = self.visit(node.children[2]) # visit end to get its value
-        
-        # for each iteration, assign the loop variable to the current value of i
+        start = self.value_of(node.children[1]) # evaluate start to get its value
+        end = self.value_of(node.children[2]) # evaluate end to get its value
+        return self.iterations(loop_var, start, end, node.children[3:])
+
+    # the body of a loop once per iteration, with the loop variable set to the current value of i
+    def iterations(self, loop_var: str, start: int, end: int, body: Sequence[ASTNode]) -> Iterator[Sequence[ASTNode]]:
         for i in range(start, end + 1):
             self.variables[loop_var] = i
-            # visit each statement in the body of the loop
-            for stmt in node.children[3:]:
-                self.visit(stmt)
+            yield body
 
     # visit print_statement nodes to print the value
-    def visit_Print(self, node: ASTNode) -> Any:
-        value = self.visit(node.children[0]) # visit expression to get its value
+    def visit_Print(self, node: ASTNode) -> None:
+        value = self.value_of(node.children[0]) # evaluate expression to get its value
         self.output.append(value) # append the value to the output list
-        return value # return the value
 
 
 
@@ -139,33 +159,39 @@ class Interpreter:
         self.variables.clear() # clear the variables
         self.output.clear() # clear the output
         yield "Starting step-by-step interpretation...\n"
-        yield from self.step_visit(node) # start from the root
+        yield from trampoline(node, self.step_visit) # start from the root -- nested nodes are run by the trampoline, not by nested generators
         yield "Interpretation complete."
 
     # visit each node in to decide the action we will take
     def step_visit(self, node: ASTNode) -> Generator[str, None, Any]:
         yield f"Visiting {node.kind} (value: {node.value})" # yield the kind and value
-        method_name = f"step_visit_{node.kind}" 
-        visitor = getattr(self, method_name, self.generic_step_visit)
+        visitor = self.step_visitors[node.kind]
         result = yield from visitor(node) # call the correct method based on the node
         yield f"Result of {node.kind}: {result}" # get the result of the node
         return result # return it
 
     # generic visit if the node is not defined
     def generic_step_visit(self, node: ASTNode) -> Generator[str, None, Any]:
-        raise InterpreterError(f"No step_visit method for {node.kind}") # description of missing node
+        raise self.fail(f"No step_visit method for {node.kind}", node) # description of missing node
 
     # visit the program node
     def step_visit_Program(self, node: ASTNode) -> Generator[str, None, Any]:
         result = None
-        for child in node.children:
-            result = yield from self.step_visit(child) # visit each child
+        line = 0 # line of the running statement, relative to the program -- statement lines count from the one before
+        try:
+            for child in node.children:
+                line += child.start >> COLUMN_BITS
+                result = yield child # visit each child
+        except InterpreterError as error:
+            error.shift(line) # relative to the program
+            error.anchor(node.start >> COLUMN_BITS) # absolute
+            raise
         return result # return the result
 
     # visit method for assignment nodes
     def step_visit_Assign(self, node: ASTNode) -> Generator[str, None, Any]:
         var_name = node.children[0].value # get the var name of the first node
-        expr_result = yield from self.step_visit(node.children[1]) # get the value of the expression node
+        expr_result = yield node.children[1] # get the value of the expression node
         self.variables[var_name] = expr_result # assign the value to the var
         yield f"Assigned {var_name} = {expr_result}" # yield the result
         return expr_result # return the value
@@ -175,7 +201,7 @@ class Interpreter:
         
         # if the variable is not assigned -- error
         if node.value not in self.variables:
-            raise InterpreterError(f"Runtime Error: Variable '{node.value}' not assigned.")
+            raise self.fail(f"Runtime Error: Variable '{node.value}' not assigned.", node)
         
         result = self.variables[node.value]
         yield f"Variable {node.value} = {result}"
@@ -189,14 +215,14 @@ class Interpreter:
 
     # visit int literals and to get and convert their values to int
     def step_visit_Int(self, node: ASTNode) -> Generator[str, None, Any]:
-        result = int(node.value)
+        result = node.value
         yield f"Integer literal: {result}"
         return result # return the int literal
 
     # visit binary operations to yield the correct result
     def step_visit_BinOp(self, node: ASTNode) -> Generator[str, None, Any]:
-        left = yield from self.step_visit(node.children[0]) # visit left operand
-        right = yield from self.step_visit(node.children[1]) # visit right operand
+        left = yield node.children[0] # visit left operand
+        right = yield node.children[1] # visit right operand
         op = node.value # get the operator node
         # use the correct action for the operand
         if op == '+':
@@ -208,20 +234,20 @@ class Interpreter:
         elif op == '/':
             # catch division by zero errors
             if right == 0:
-                raise InterpreterError("Runtime Error: Division by zero.")
+                raise self.fail("Runtime Error: Division by zero.", node)
             result = left // right
         elif op == '%':
             result = left % right
         # catch unknown operators
         else:
-            raise InterpreterError(f"Unknown operator: {op}")
+            raise self.fail(f"Unknown operator: {op}", node)
         yield f"Computed {left} {op} {right} = {result}" # calculate the result
         return result # return it
 
     # visit logical operators to yield the correct result
     def step_visit_LogicOp(self, node: ASTNode) -> Generator[str, None, Any]:
-        left = yield from self.step_visit(node.children[0]) # visit left operand
-        right = yield from self.step_visit(node.children[1]) # visit right operand
+        left = yield node.children[0] # visit left operand
+        right = yield node.children[1] # visit right operand
         # use the correct action value based on the operator
         if node.value == '&&':
             result = left and right
@@ -229,14 +255,14 @@ class Interpreter:
             result = left or right
         # catch unknown operator errors
         else:
-            raise InterpreterError(f"Unknown logic operator: {node.value}")
+            raise self.fail(f"Unknown logic operator: {node.value}", node)
         yield f"Computed {left} {node.value} {right} = {result}" # compute the result
         return result # return it
 
     # visit relative operations to yield the correct result
     def step_visit_RelOp(self, node: ASTNode) -> Generator[str, None, Any]:
-        left = yield from self.step_visit(node.children[0]) # visit left operand
-        right = yield from self.step_visit(node.children[1]) # visit right operand
+        left = yield node.children[0] # visit left operand
+        right = yield node.children[1] # visit right operand
         # use the correct action value based on the operator
         if node.value == '==':
             result = left == right
@@ -252,39 +278,52 @@ class Interpreter:
             result = left <= right
         else:
             # catch unknown operator errors
-            raise InterpreterError(f"Unknown relational operator: {node.value}")
+            raise self.fail(f"Unknown relational operator: {node.value}", node)
         yield f"Computed {left} {node.value} {right} = {result}" # compute the result
         return result # return it
 
     # visit visit if statements to calculate the proper conditions
     def step_visit_If(self, node: ASTNode) -> Generator[str, None, Any]:
-        condition = yield from self.step_visit(node.children[0]) # visit the condition node to get its value
+        condition = yield node.children[0] # visit the condition node to get its value
         yield f"If condition evaluated to {condition}" # get the result of the condition
         
         # if the condition is true, visit each statement in the body
         if condition:
-            for stmt in node.children[1:]:
-                yield from self.step_visit(stmt)
+            line = 0 # line of the running statement, relative to the if statement
+            try:
+                for stmt in node.children[1:]:
+                    line += stmt.start >> COLUMN_BITS
+                    yield stmt
+            except InterpreterError as error:
+                error.shift(line) # relative to the if statement
+                raise
         return None # no need to return a value
 
     # visit loop statements to calculate their range
     def step_visit_Loop(self, node: ASTNode) -> Generator[str, None, Any]:
         loop_var = node.children[0].value # get the loop var nam from initial node
-        start = yield from self.step_visit(node.children[1]) # visit start expression to get its value
-        end = yield from self.step_visit(node.children[2]) # visit end expression to get its value
+        start = yield node.children[1] # visit start expression to get its value
+        end = yield node.children[2] # visit end expression to get its value
         yield f"Loop: {loop_var} from {start} to {end}" # yield the loop range.
+        body = node.children[3:]
         # for each iteration, assign the loop variable to the current value of i
-        for i in range(start, end + 1):
-            self.variables[loop_var] = i
-            yield f"Loop iteration: {loop_var} = {i}"
-            # visit each statement in the body of the loop
-            for stmt in node.children[3:]:
-                yield from self.step_visit(stmt)
+        try:
+            for i in range(start, end + 1):
+                self.variables[loop_var] = i
+                yield f"Loop iteration: {loop_var} = {i}"
+                # visit each statement in the body of the loop
+                line = 0 # line of the running statement, relative to the loop statement
+                for stmt in body:
+                    line += stmt.start >> COLUMN_BITS
+                    yield stmt
+        except InterpreterError as error:
+            error.shift(line) # relative to the loop statement
+            raise
         return None # no need to return a value
 
     # visit print statements to yield their results
     def step_visit_Print(self, node: ASTNode) -> Generator[str, None, Any]:
-        value = yield from self.step_visit(node.children[0]) # visit the expression node to get its value
+        value = yield node.children[0] # visit the expression node to get its value
         self.output.append(value) # append the value to the output
         yield f"Printed: {value}" # yield it
         return value # return it
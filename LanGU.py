@@ -3,12 +3,14 @@ import sys
 import os
 import tkinter as tk
 from tkinter import filedialog, scrolledtext
-from AST_Tree import ASTParser, print_tree, ASTNode
+from AST_Tree import ASTParser, IncrementalParser, print_tree
 from io import StringIO
-from semantics import SemanticAnalyzer
+from semantics import IncrementalAnalyzer
 from Interpreter import Interpreter
-from lexer import Lexer, TokenType
+from optimizer import Optimizer
+from lexer import IncrementalLexer, Lexer, TokenType
 from parser import Parser
+from errors import UNUSED_VARIABLE, USED_BEFORE_ASSIGNMENT, ParserError
 # cspell:ignore _MEIPASS
 # cspell:ignore MULT_OP
 # cspell: ignore darkgreen
@@ -147,6 +149,9 @@ class LanGU:
         self.current_step = 1 # current step
         self.dark_mode = True # default theme is dark mode
         self.token_colors = self.DARK_TOKEN_COLORS
+        self.highlight_lexer = IncrementalLexer() # keeps the tokens between keystrokes for syntax highlighting
+        self.parser = IncrementalParser() # keeps the AST of the last successful parse, re-parses only what an edit touched
+        self.analyzer = IncrementalAnalyzer() # keeps a summary of every statement, analyzes only what an edit changed
 
         # main gui container layout
         self.create_main_container() # entire gui app
@@ -283,6 +288,11 @@ class LanGU:
     def get_source_code(self):
         return self.text_area.get("1.0", tk.END).strip() # strip the white-space
 
+    # parse the code into an AST -- Tree, Semantics, Interpret and Step share one parse, and after an edit
+    # only the statements on the changed lines are parsed again
+    def parse_source(self, source_code):
+        return self.parser.parse(source_code) # raises on syntax errors
+
     # reset the step interpreter
     def reset_interpreter_state(self):
         self.interpreter_step_gen = None
@@ -297,37 +307,27 @@ class LanGU:
         self.dark_mode = not self.dark_mode # toggle dark mode
         self.set_theme() # update the theme
     
-    # highlight syntax in the text area
+    # highlight syntax in the text area -- only the lines changed since the last call are re-lexed and re-tagged,
+    # the tags on every other line move along with the text by themselves
     def highlight_syntax(self, event=None):
-        # for each token type
+        source = self.text_area.get("1.0", "end-1c") # the raw text, so line numbers match the widget
+        first, _, added, tokens = self.highlight_lexer.update(source) # re-lex the edited lines
+
+        # remove the previous tags on the changed lines
         for tok_type in self.token_colors:
-            self.text_area.tag_remove(tok_type.name, "1.0", tk.END) # remove the previous tag
+            self.text_area.tag_remove(tok_type.name, f"{first}.0", f"{first + added - 1}.end")
 
+        # tag each new token for syntax highlighting
+        line_index = self.highlight_lexer.line_index # line starts of the changed lines
+        for tok in tokens:
+            col = line_index.column(tok.start)
+            self.text_area.tag_add(tok.token_type.name, f"{tok.line}.{col}", f"{tok.line}.{col + len(tok.lexeme)}")
+
+    # set the colors of the syntax highlight tags
+    def configure_syntax_tags(self):
         # for each token type
         for tok_type, color in self.token_colors.items():
-            tag = tok_type.name
-            self.text_area.tag_config(tag, foreground=color) # set the font and background color
-
-        source = self.get_source_code() # get the current source code
-        lexer  = Lexer(source) # lex it
-        tokens = lexer.get_tokens() # get the tokens
-
-        # build the table to map line numbers to character offsets
-        lines = source.splitlines(True)
-        offsets = []
-        running = 0
-        # for each line, add the line length to the running total and store the offset
-        for ln in lines:
-            offsets.append(running)
-            running += len(ln)
-
-        # tag each token for syntax highlighting
-        for tok in tokens:
-            base = offsets[tok.line - 1]
-            col  = tok.start - base
-            start_index = f"{tok.line}.{col}"
-            end_index   = f"{tok.line}.{col + len(tok.lexeme)}"
-            self.text_area.tag_add(tok.token_type.name, start_index, end_index)
+            self.text_area.tag_config(tok_type.name, foreground=color) # set the font color
 
     # configure the output area syntax tags based on the current token colors        
     def configure_output_syntax_tags(self):
@@ -384,7 +384,8 @@ class LanGU:
         # swap syntax-highlight map
         self.token_colors = self.DARK_TOKEN_COLORS if self.dark_mode else self.LIGHT_TOKEN_COLORS
 
-        # reprocess syntax highlights
+        # recolor syntax highlights
+        self.configure_syntax_tags()
         self.highlight_syntax()
         self.configure_output_syntax_tags()
         
@@ -494,13 +495,16 @@ class LanGU:
     def parse_code(self):
         self.reset_interpreter_state()
         source_code = self.get_source_code()
-        lexer = Lexer(source_code)
-        tokens = lexer.get_tokens()
-        parser = Parser(tokens) # create a parser instance with the tokens
         
         # try to parse the source code and display the result in the output area
         try:
-            result = parser.parse()
+            # already parsed into an AST -- nothing to validate
+            if self.parser.source == source_code:
+                result = "Parsing completed successfully"
+            else:
+                lexer = Lexer(source_code)
+                parser = Parser(lexer.get_tokens(), source_code, lexer.line_index) # validate only, no AST
+                result = parser.parse()
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear output area
             self.output_area.insert(tk.END, result, "parse_success") # insert success message
@@ -508,11 +512,9 @@ class LanGU:
         # if parsing fails... we get an exceptions
         except Exception as e:
             error_message = f"Parsing Error: {e}" # store the error message
-            import re # import regex module to search for line numbers in the error message
-            match = re.search(r"at line (\d+)", error_message) # search for line number in the error message
-            # if a line number is found in the error message
-            if match:
-                line_num = int(match.group(1)) # extract the line number from the match
+            line_num = getattr(e, "line", None) # syntax errors carry their position
+            # if we know the line of the error
+            if isinstance(line_num, int):
                 # if the error message we were missing a semi
                 if "Expecting semicolon" in error_message and line_num > 1:
                     new_line = line_num - 1 # set the line to the previous line
@@ -531,16 +533,13 @@ class LanGU:
     def show_ast(self):
         self.reset_interpreter_state()
         source_code = self.get_source_code() # get the code
-        lexer = Lexer(source_code) # lex it
-        tokens = lexer.get_tokens() # get the tokens
-        parser = ASTParser(tokens, source_code) # create the AST parser instance
         original_stdout = sys.stdout # save the original so we can restore it later
         ast_output = StringIO() # create a StringIO object to capture the AST output
         sys.stdout = ast_output # redirect stdout to the object
         
         # try to parse the source code and generate the AST
         try:
-            ast_tree = parser.parse()
+            ast_tree = self.parse_source(source_code)
             print_tree(ast_tree) # print the AST to the StringIO object
             ast_str = ast_output.getvalue() # get the string value
             self.output_area.config(state=tk.NORMAL)
@@ -549,10 +548,8 @@ class LanGU:
         # if parsing fails we land here
         except Exception as e:
             error_message = f"Parsing Error: {e}"
-            import re # import regex module to search for line numbers in the error message
-            match = re.search(r"at line (\d+)", error_message) # search for line number in the error message
-            if match:
-                line_num = int(match.group(1)) # if a line number is found, extract it
+            line_num = getattr(e, "line", None) # syntax errors carry their position
+            if isinstance(line_num, int):
                 self.highlight_error_line(line_num) # highlight the line where the error occurred
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear the output area
@@ -566,12 +563,9 @@ class LanGU:
     def semantic_check(self):
         self.reset_interpreter_state()
         source_code = self.get_source_code()
-        lexer = Lexer(source_code)
-        tokens = lexer.get_tokens()
-        parser = ASTParser(tokens, source_code) # create AST instance with tokens and source code
         try:
-            ast = parser.parse() # try to parse the source code and generate the AST
-            analyzer = SemanticAnalyzer() # create a semantic analyzer instance
+            ast = self.parse_source(source_code) # try to parse the source code and generate the AST
+            analyzer = self.analyzer # the analyzer shared between runs
             analyzer.analyze(ast) # perform semantic analysis on the AST
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear the output area
@@ -586,16 +580,16 @@ class LanGU:
             max_var_len = max((len(var) for var in analyzer.symbol_table.keys()), default=0)
             
             # go through the table to display the variable names, types, assignment counts, and usage counts
-            for var, meta in analyzer.symbol_table.items():
-                formatted = (f"{var.ljust(max_var_len)} : type = {meta['type']:<4}  "
-                             f"assignments = {meta['assignment_count']:<2}  usages = {meta['usage_count']:<2}")
+            for var, symbol in analyzer.symbol_table.items():
+                formatted = (f"{var.ljust(max_var_len)} : type = {symbol.type:<4}  "
+                             f"assignments = {symbol.assignment_count:<2}  usages = {symbol.usage_count:<2}")
                 self.output_area.insert(tk.END, formatted + "\n")
                 
             # if we generate any warnings, display them
-            if analyzer.warnings:
+            if analyzer.diagnostics:
                 self.output_area.insert(tk.END, "\nWarnings:\n", "warning_header")
-                used_before = [w for w in analyzer.warnings if "used before assignment" in w]
-                assigned_never = [w for w in analyzer.warnings if "assigned but never used" in w]
+                used_before = analyzer.diagnostics.of(USED_BEFORE_ASSIGNMENT)
+                assigned_never = analyzer.diagnostics.of(UNUSED_VARIABLE)
                 
                 # display warnings
                 for warning in used_before:
@@ -612,10 +606,8 @@ class LanGU:
         # if semantic analysis fails -- we land here
         except Exception as e:
             error_message = str(e) # store the error message
-            import re
-            match = re.search(r"at line (\d+)", error_message) # search for line number in the error message
-            if match:
-                line_num = int(match.group(1)) # extract the line number from the match
+            line_num = getattr(e, "line", None) # parse and semantic errors carry their line
+            if isinstance(line_num, int):
                 self.highlight_error_line(line_num) # highlight the line where the error occurred
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear the output area
@@ -627,15 +619,15 @@ class LanGU:
     def interpret_code(self):
         self.reset_interpreter_state() 
         source_code = self.get_source_code()
-        lexer = Lexer(source_code)
-        tokens = lexer.get_tokens()
-        parser = ASTParser(tokens, source_code) # create an AST instance
         try:
-            ast = parser.parse() # try to parse code and generate the AST
-            analyzer = SemanticAnalyzer() # create a semantic analyzer instance
+            ast = self.parse_source(source_code) # try to parse code and generate the AST
+            analyzer = self.analyzer # the analyzer shared between runs
             analyzer.analyze(ast) # perform semantic analysis on the AST
+            # fold constants and drop code that does nothing -- the output and variables stay the same
+            optimizer = Optimizer(warning.variable for warning in analyzer.diagnostics.of(UNUSED_VARIABLE))
+            optimized = optimizer.optimize(ast)
             interpreter = Interpreter() # create an interpreter instance
-            status, output_list, variables = interpreter.interpret(ast) # interpret the AST
+            status, output_list, variables = interpreter.interpret(optimized) # interpret the optimized AST
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear the output area
             self.output_area.tag_config("warning_header", foreground="#FF8C00", font=('TkDefaultFont', 10, 'bold'), underline=True)
@@ -654,6 +646,9 @@ class LanGU:
             # else if the interpretation fails, display the error message
             else:
                 self.output_area.insert(tk.END, f"{status}\n", "interpret_fail")
+                line_num = getattr(interpreter.error, "line", None) # runtime errors carry the line they failed on
+                if isinstance(line_num, int):
+                    self.highlight_error_line(line_num)
             # if there are variables, get the maximum length of variable names
             if variables:
                 max_var_len = max(len(var) for var in variables)
@@ -662,13 +657,18 @@ class LanGU:
                 # insert each variable and its value
                 for var, val in variables.items():
                     self.output_area.insert(tk.END, f"{var.ljust(max_var_len)} : {val}\n")
+            # what the optimizer changed before running
+            self.output_area.tag_config("optimizer_header", foreground="green", font=('TkDefaultFont', 10, 'bold'))
+            self.output_area.insert(tk.END, f"\nOptimizations: {optimizer.summary()}\n", "optimizer_header")
+            for change in optimizer.report:
+                self.output_area.insert(tk.END, f"- {change}\n")
             # if there are any warnings from semantic analysis, display them
-            if analyzer.warnings:
+            if analyzer.diagnostics:
                 self.output_area.insert(tk.END, "\nWarnings:\n", "warning_header") # insert the header for warnings
                 
-                # filter the warnings
-                used_before = [w for w in analyzer.warnings if "used before assignment" in w]
-                assigned_never = [w for w in analyzer.warnings if "assigned but never used" in w]
+                # the warnings by kind
+                used_before = analyzer.diagnostics.of(USED_BEFORE_ASSIGNMENT)
+                assigned_never = analyzer.diagnostics.of(UNUSED_VARIABLE)
                 
                 # insert each warning
                 for warning in used_before:
@@ -683,10 +683,8 @@ class LanGU:
         # if parsing or semantic analysis fails -- we land here
         except Exception as e:
             error_message = str(e) # store the error message
-            import re
-            match = re.search(r"at line (\d+)", error_message) # search for line number in the error message
-            if match:
-                line_num = int(match.group(1)) # if a line number is found, extract it
+            line_num = getattr(e, "line", None) # parse and semantic errors carry their line
+            if isinstance(line_num, int):
                 self.highlight_error_line(line_num) # highlight the line where the error occurred
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear the output area
@@ -699,50 +697,25 @@ class LanGU:
         # if the interpreter step generator is not initialized, do so
         if not self.interpreter_step_gen:
             source = self.get_source_code()
-            lexer = Lexer(source)
-            tokens = lexer.get_tokens()
-            parser = ASTParser(tokens, source) # create an AST instance
-            # try to parse the source code and generate the AST
+            # parse the source code into an AST
             try:
+                ast, parse_errors = self.parse_source(source), []
+            # a recovering parse -- every syntax error, and an AST of the statements that did parse
+            except ParserError:
+                lexer = Lexer(source)
+                parser = ASTParser(lexer.get_tokens(), source, lexer.line_index, recover=True)
                 ast = parser.parse()
-                parse_error = None # no error if we succeed
-                
-            # if parsing fails -- we land here, try to create an empty AST node
-            except Exception as e:
-                parse_error = str(e) # store the error message
-                # if there are no tokens, create an empty AST node
-                if not tokens:
-                    ast = ASTNode('Program', 'program', [])
-                # else create a new AST parser instance with the tokens and source code
-                else:
-                    parser = ASTParser(tokens, source)
-                    stmts = [] # create an empty list for statements
-                    
-                    # if there are tokens, try generate the AST
-                    if parser.current_token:
-                        # try to match the PROGRAM token
-                        try:
-                            parser.match(TokenType.PROGRAM)
-                            # while there are tokens and the current token is not END_P
-                            while parser.current_token and parser.current_token.token_type != TokenType.END_P:
-                                # try to append the statement to the list
-                                try:
-                                    stmts.append(parser.statement())
-                                # on error, break the loop
-                                except Exception:
-                                    break
-                        # if there is an exception in matching the PROGRAM token, pass because we already have an error message
-                        except Exception:
-                            pass
-                    ast = ASTNode('Program', 'program', stmts) # there are valid tokens, so create an AST node with the statements
+                parse_errors = parser.errors
             self.interpreter_step_gen = Interpreter().interpret_step(ast) # create step-generator with the AST
             self.current_step = 1 # reset the current step counter
             self.output_area.config(state=tk.NORMAL)
             self.output_area.delete("1.0", tk.END) # clear the output area
             
-            # if there is a parse error, insert the error message
-            if parse_error:
-                self.output_area.insert(tk.END, f"Parse Error (will resume until here): {parse_error}\n\n", "parse_error")
+            # if there are parse errors, insert the error messages
+            for parse_error in parse_errors:
+                self.output_area.insert(tk.END, f"Parse Error: {parse_error}\n", "parse_error")
+            if parse_errors:
+                self.output_area.insert(tk.END, "\n")
             self.output_area.config(state=tk.DISABLED)
         # try to get the next step from the step-generator
         try:
@@ -762,6 +735,9 @@ class LanGU:
             
         # if there is a runtime error -- we land here
         except Exception as e:
+            line_num = getattr(e, "line", None) # runtime errors carry the line they failed on
+            if isinstance(line_num, int):
+                self.highlight_error_line(line_num)
             self.output_area.config(state=tk.NORMAL)
             self.output_area.insert("1.0", f"Runtime Error: {e}\n", "error")
             self.output_area.config(state=tk.DISABLED)
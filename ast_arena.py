@@ -0,0 +1,156 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+from AST_Tree import ASTNode, NodeKind
+# cSpell:ignore preorder
+
+KIND_BY_CODE = {kind.value: kind for kind in NodeKind} # column value -> NodeKind
+NONE = -1 # no value / no child / no sibling
+
+
+# a whole AST in typed columns instead of one object (and one child list) per node.
+# nodes are numbered in preorder, so a subtree is a contiguous run of indexes starting at its root
+class ASTArena:
+    def __init__(self, tree: Optional[ASTNode] = None):
+        self.kinds = array('B') # NodeKind of each node
+        self.values = array('i') # index of its value in the constant pool, or NONE
+        self.first_child = array('i') # index of its first child, or NONE
+        self.next_sibling = array('i') # index of its next sibling, or NONE
+        self.starts = array('q') # packed start position (see ASTNode)
+        self.ends = array('q') # packed end position
+        self.constants: List[Any] = [] # literals and names, each stored once
+        self.pool: Dict[Any, int] = {} # constant -> its index
+        if tree is not None:
+            self.add(tree)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    # the root of the tree
+    def root(self) -> 'Cursor':
+        return Cursor(self, 0)
+
+    # index of a constant, added on first use
+    def constant(self, value: Any) -> int:
+        index = self.pool.get(value)
+        if index is None:
+            index = self.pool[value] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    # one node, unlinked
+    def append(self, node: ASTNode) -> int:
+        self.kinds.append(node.kind)
+        self.values.append(NONE if node.value is None else self.constant(node.value))
+        self.first_child.append(NONE)
+        self.next_sibling.append(NONE)
+        self.starts.append(node.start)
+        self.ends.append(node.end)
+        return len(self.kinds) - 1
+
+    # copy an ASTNode tree in -- returns the index of its root. an explicit stack, so depth is no limit
+    def add(self, tree: ASTNode) -> int:
+        first_child, next_sibling = self.first_child, self.next_sibling
+        root = self.append(tree)
+        stack = [(root, iter(tree.children), NONE)] # (parent, its children left to add, last child added)
+        while stack:
+            parent, children, last = stack[-1]
+            child = next(children, None)
+            # all of this node's children are in
+            if child is None:
+                stack.pop()
+                continue
+            index = self.append(child)
+            if last == NONE:
+                first_child[parent] = index
+            else:
+                next_sibling[last] = index
+            stack[-1] = (parent, children, index)
+            if child.children:
+                stack.append((index, iter(child.children), NONE))
+        return root
+
+    # indexes of the children of a node
+    def children(self, index: int) -> Iterator[int]:
+        child = self.first_child[index]
+        while child != NONE:
+            yield child
+            child = self.next_sibling[child]
+
+    # value of a node
+    def value(self, index: int) -> Any:
+        value = self.values[index]
+        return None if value == NONE else self.constants[value]
+
+    # one past the last node of the subtree at index
+    def subtree_end(self, index: int) -> int:
+        # the last node in preorder is reached by always taking the last child
+        while self.first_child[index] != NONE:
+            for index in self.children(index):
+                pass
+        return index + 1
+
+    # back to ASTNode form -- children are built before their parents, walking the subtree's indexes backwards
+    def to_tree(self, index: int = 0) -> ASTNode:
+        end = self.subtree_end(index)
+        nodes: List[Optional[ASTNode]] = [None] * (end - index)
+        for current in range(end - 1, index - 1, -1):
+            children = [nodes[child - index] for child in self.children(current)]
+            nodes[current - index] = ASTNode(KIND_BY_CODE[self.kinds[current]], self.value(current), children or None,
+                                             self.starts[current], self.ends[current])
+        return nodes[0]
+
+
+# a node of an arena, with the same kind / value / children / start / end fields as ASTNode --
+# SemanticAnalyzer, Interpreter and print_tree walk cursors just like nodes
+class Cursor:
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena: ASTArena, index: int):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def kind(self) -> NodeKind:
+        return KIND_BY_CODE[self.arena.kinds[self.index]]
+
+    @property
+    def value(self) -> Any:
+        return self.arena.value(self.index)
+
+    @property
+    def children(self) -> List['Cursor']:
+        arena = self.arena
+        return [Cursor(arena, child) for child in arena.children(self.index)]
+
+    @property
+    def start(self) -> int:
+        return self.arena.starts[self.index]
+
+    @property
+    def end(self) -> int:
+        return self.arena.ends[self.index]
+
+    @property
+    def first_child(self) -> Optional['Cursor']:
+        child = self.arena.first_child[self.index]
+        return None if child == NONE else Cursor(self.arena, child)
+
+    @property
+    def next_sibling(self) -> Optional['Cursor']:
+        sibling = self.arena.next_sibling[self.index]
+        return None if sibling == NONE else Cursor(self.arena, sibling)
+
+    # this subtree as ASTNodes
+    def to_tree(self) -> ASTNode:
+        return self.arena.to_tree(self.index)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Cursor) and other.arena is self.arena and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.arena), self.index))
+
+    # same text as ASTNode
+    def __repr__(self) -> str:
+        value = self.value
+        return f"{self.kind}('{value}')" if value is not None else self.kind.name
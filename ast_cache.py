@@ -0,0 +1,229 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+from AST_Tree import ASTNode, ASTParser, NodeKind
+from lexer import Lexer
+# cSpell:ignore preorder
+
+# binary AST file:
+#   header     magic, format version, sha256 of the source, node / constant counts, size of the constant text
+#   constants  one type tag and one length per constant, then their text as one UTF-8 block (ints in decimal)
+#   nodes      in preorder, one column each: kind, child count, constant index (-1 for none), start, end
+# columns are little-endian, read straight out of the file with array.frombytes -- no tokens, no parsing
+MAGIC = b"LGAS"
+VERSION = 1 # bump whenever the AST or this format changes, old files are then ignored
+HEADER = struct.Struct("<4sH2x32sIII")
+INT, STR = 0, 1 # constant type tags
+SUFFIX = ".lgast"
+CACHE_DIR = "__langu_cache__" # default cache directory, next to the source file (like __pycache__)
+KIND_BY_CODE = {kind.value: kind for kind in NodeKind}
+SWAP = sys.byteorder != "little" # the columns are stored little-endian
+
+
+# sha256 of a program's source
+def source_hash(source: str) -> bytes:
+    return hashlib.sha256(source.encode("utf-8")).digest()
+
+# a column, little-endian
+def column_bytes(column: array) -> bytes:
+    if SWAP:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+# the AST of source, serialized
+def dumps(tree: ASTNode, source: str) -> bytes:
+    kinds, counts, values = array('B'), array('I'), array('i')
+    starts, ends = array('q'), array('q')
+    constants: Dict[object, int] = {} # constant -> index, each stored once
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        kinds.append(node.kind)
+        counts.append(len(node.children))
+        value = node.value
+        if value is None:
+            values.append(-1)
+        else:
+            key = (type(value), value)
+            index = constants.get(key)
+            if index is None:
+                index = constants[key] = len(constants)
+            values.append(index)
+        starts.append(node.start)
+        ends.append(node.end)
+        stack.extend(reversed(node.children)) # the first child is visited next
+    tags = array('B', (INT if kind is int else STR for kind, _ in constants))
+    texts = [str(value).encode("utf-8") for _, value in constants]
+    lengths = array('I', (len(text) for text in texts))
+    text = b"".join(texts)
+    header = HEADER.pack(MAGIC, VERSION, source_hash(source), len(kinds), len(tags), len(text))
+    return b"".join([header, tags.tobytes(), column_bytes(lengths), text, kinds.tobytes(),
+                     column_bytes(counts), column_bytes(values), column_bytes(starts), column_bytes(ends)])
+
+# the AST in data (bytes or an mmap) -- raises ValueError if it is not an AST file of this version,
+# or (when digest is given) not the AST of the source with that hash
+def loads(data: Union[bytes, mmap.mmap], digest: Optional[bytes] = None) -> ASTNode:
+    if len(data) < HEADER.size:
+        raise ValueError("not a LanGU AST file")
+    magic, version, source_digest, count, constant_count, text_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a LanGU AST file")
+    if version != VERSION:
+        raise ValueError(f"LanGU AST file version {version}, expected {VERSION}")
+    if digest is not None and digest != source_digest:
+        raise ValueError("LanGU AST file is for a different source")
+    with memoryview(data) as view:
+        position = HEADER.size
+
+        # read the next column
+        def column(typecode: str, length: int) -> array:
+            nonlocal position
+            values = array(typecode)
+            size = values.itemsize * length
+            if position + size > len(view):
+                raise ValueError("LanGU AST file is truncated")
+            values.frombytes(view[position:position + size])
+            position += size
+            if SWAP:
+                values.byteswap()
+            return values
+
+        tags = column('B', constant_count)
+        lengths = column('I', constant_count)
+        text = column('B', text_size).tobytes()
+        constants: List[object] = []
+        offset = 0
+        for tag, length in zip(tags, lengths):
+            value = text[offset:offset + length].decode("utf-8")
+            constants.append(int(value) if tag == INT else value)
+            offset += length
+        kinds, counts, values = column('B', count), column('I', count), column('i', count)
+        starts, ends = column('q', count), column('q', count)
+
+    # build from the last node back: a node's children are the last ones built, on top of the stack
+    stack: List[ASTNode] = []
+    kind_of = KIND_BY_CODE
+    for kind, children, value, start, end in zip(reversed(kinds), reversed(counts), reversed(values), reversed(starts), reversed(ends)):
+        if children:
+            nodes = stack[-children:]
+            del stack[-children:]
+            nodes.reverse()
+        else:
+            nodes = None
+        stack.append(ASTNode(kind_of[kind], constants[value] if value >= 0 else None, nodes, start, end))
+    if len(stack) != 1:
+        raise ValueError("LanGU AST file is corrupt")
+    return stack[0]
+
+# the AST stored in a file, read through mmap
+def load(path: str, digest: Optional[bytes] = None) -> ASTNode:
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return loads(data, digest)
+
+
+# directory of parsed programs, one file per source hash -- a program whose source is unchanged is loaded, not parsed.
+# the directory is kept under max_bytes by removing the least recently used files (a hit marks a file as used)
+class ParseCache:
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict() # file name -> size, least recently used first
+        self.size = 0 # bytes in the directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        # files left by earlier runs, oldest first
+        files = [entry for entry in os.scandir(directory) if entry.name.endswith(SUFFIX) and entry.is_file()]
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            self.entries[entry.name] = entry.stat().st_size
+            self.size += self.entries[entry.name]
+
+    # the cached AST of source, or None
+    def get(self, source: str) -> Optional[ASTNode]:
+        digest = source_hash(source)
+        name = digest.hex() + SUFFIX
+        path = os.path.join(self.directory, name)
+        try:
+            tree = load(path, digest)
+        # not cached -- or left by another version, or damaged: it is dropped and parsed again
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                self.remove(name)
+            self.misses += 1
+            return None
+        self.hits += 1
+        # most recently used, here and for the next run
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if name in self.entries:
+            self.entries.move_to_end(name)
+        else:
+            self.entries[name] = os.path.getsize(path) # written by another process
+            self.size += self.entries[name]
+        return tree
+
+    # store the AST of source -- written to a temporary file and renamed, so a reader never sees half a file
+    def put(self, source: str, tree: ASTNode) -> None:
+        data = dumps(tree, source)
+        name = source_hash(source).hex() + SUFFIX
+        path = os.path.join(self.directory, name)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        self.size += len(data) - self.entries.pop(name, 0)
+        self.entries[name] = len(data)
+        self.evict()
+
+    # the AST of source, from the cache or parsed (and then cached) -- raises ParserError on syntax errors
+    def parse(self, source: str) -> ASTNode:
+        tree = self.get(source)
+        if tree is None:
+            lexer = Lexer(source)
+            tree = ASTParser(lexer.get_tokens(), source, lexer.line_index).parse()
+            self.put(source, tree)
+        return tree
+
+    # drop least recently used files until the directory fits, always keeping the newest one
+    def evict(self) -> None:
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            self.remove(next(iter(self.entries)))
+
+    # delete one file
+    def remove(self, name: str) -> None:
+        self.size -= self.entries.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    from Interpreter import Interpreter
+    from errors import ParserError
+    if len(sys.argv) not in (2, 3):
+        print('Usage: python ast_cache.py <source-file> [<cache-dir>]')
+        sys.exit(1)
+    with open(sys.argv[1]) as src:
+        source = src.read()
+    # run the program, parsing it only if its source changed since the last run
+    cache = ParseCache(sys.argv[2] if len(sys.argv) == 3 else os.path.join(os.path.dirname(os.path.abspath(sys.argv[1])), CACHE_DIR))
+    try:
+        tree = cache.parse(source)
+    except ParserError as e:
+        print(e) # print errors
+        sys.exit(1)
+    status, output, _ = Interpreter().interpret(tree)
+    for line in output:
+        print(line)
+    if status != "success":
+        print(status)
+        sys.exit(1)
@@ -0,0 +1,284 @@
+import sys
+import time
+import tracemalloc
+import os
+from lexer import Lexer, TokenBuffer, lex_parallel
+from parser import Parser
+from AST_Tree import ASTNode, ASTParser, IncrementalParser
+from Interpreter import Interpreter
+from semantics import IncrementalAnalyzer, SemanticAnalyzer
+from dataflow import DataflowAnalyzer
+from optimizer import Optimizer
+from ast_arena import ASTArena
+from ast_cache import ParseCache
+# cspell: ignore tracemalloc
+
+
+# build a large program by repeating the body of a sample program
+def scaled_program(path: str, times: int) -> str:
+    with open(path, "r", encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    start = lines.index("program") + 1 if "program" in lines else 1 # first line of the body
+    end = max(i for i, line in enumerate(lines) if line.strip() == "end_program") # last line of the body
+    body = "\n".join(lines[start:end])
+    return "program\n" + "\n".join([body] * times) + "\nend_program\n"
+
+# measure the memory still held by whatever build() returns, and how long it took
+def measure(build):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - begin
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+# list-of-Token vs TokenBuffer
+def bench_token_memory(source: str) -> None:
+    tokens, list_size, list_time = measure(lambda: Lexer(source).get_tokens())
+    buffer, buffer_size, buffer_time = measure(lambda: TokenBuffer(source))
+    print(f"source            : {len(source):>12,} chars, {len(tokens):,} tokens")
+    print(f"list of Token     : {list_size:>12,} bytes  {list_size / len(tokens):6.1f} B/token  {list_time:.3f}s")
+    print(f"TokenBuffer       : {buffer_size:>12,} bytes  {buffer_size / len(buffer):6.1f} B/token  {buffer_time:.3f}s")
+    print(f"ratio             : {list_size / buffer_size:.1f}x smaller")
+
+# serial TokenBuffer vs lex_parallel with 1, 2, 4, ... workers
+def bench_parallel_lexing(source: str) -> None:
+    begin = time.perf_counter()
+    TokenBuffer(source)
+    serial = time.perf_counter() - begin
+    print(f"serial            : {serial:.3f}s")
+    workers = 2
+    while workers <= (os.cpu_count() or 1):
+        begin = time.perf_counter()
+        lex_parallel(source, workers)
+        elapsed = time.perf_counter() - begin
+        print(f"{workers:>2} workers        : {elapsed:.3f}s  {serial / elapsed:.1f}x")
+        workers *= 2
+
+# validate-only Parser vs AST-building ASTParser over the same token list
+def bench_parsing(source: str) -> None:
+    tokens = Lexer(source).get_tokens()
+    for name, parser in (("Parser", Parser), ("ASTParser", ASTParser)):
+        begin = time.perf_counter()
+        parser(tokens, source).parse()
+        elapsed = time.perf_counter() - begin
+        print(f"{name:<18}: {elapsed:.3f}s  {len(tokens) / elapsed:,.0f} tokens/s")
+
+# full parse vs re-parsing after a one-character edit in the middle of the program
+def bench_incremental_parsing(source: str) -> None:
+    parser = IncrementalParser()
+    begin = time.perf_counter()
+    parser.parse(source)
+    full = time.perf_counter() - begin
+    position = source.index(" 1", len(source) // 2) + 1 # a literal half-way through
+    edited = source[:position] + "7" + source[position + 1:]
+    begin = time.perf_counter()
+    parser.parse(edited)
+    elapsed = time.perf_counter() - begin
+    print(f"full parse        : {full:.3f}s")
+    print(f"one-char edit     : {elapsed * 1000:.2f}ms  lines {parser.reparsed}")
+
+# the AST node as it was before __slots__ and NodeKind: string kind and value, a list for every node's children
+class LegacyNode:
+    def __init__(self, kind, value=None, children=None):
+        self.kind = kind
+        self.value = value
+        self.children = children or []
+
+def to_legacy(node: ASTNode) -> LegacyNode:
+    value = None if node.value is None else str(node.value)
+    return LegacyNode(node.kind.name, value, [to_legacy(child) for child in node.children])
+
+# the interpreter's old dispatch: a getattr per node on the legacy string kinds, recursion for every child, and
+# int() every time a literal is evaluated. Its own visit methods -- the Interpreter's run on NodeKind visitor tables
+class LegacyInterpreter(Interpreter):
+    def visit(self, node):
+        return getattr(self, f"visit_{node.kind}", self.generic_visit)(node)
+
+    def visit_Program(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_Assign(self, node):
+        self.variables[node.children[0].value] = self.visit(node.children[1])
+
+    def visit_Int(self, node):
+        return int(node.value)
+
+    def visit_BinOp(self, node):
+        return super().visit_BinOp(node, self.visit(node.children[0]), self.visit(node.children[1]))
+
+    def visit_LogicOp(self, node):
+        return super().visit_LogicOp(node, self.visit(node.children[0]), self.visit(node.children[1]))
+
+    def visit_RelOp(self, node):
+        return super().visit_RelOp(node, self.visit(node.children[0]), self.visit(node.children[1]))
+
+    def visit_If(self, node):
+        if self.visit(node.children[0]):
+            for child in node.children[1:]:
+                self.visit(child)
+
+    def visit_Loop(self, node):
+        loop_var = node.children[0].value
+        for i in range(self.visit(node.children[1]), self.visit(node.children[2]) + 1):
+            self.variables[loop_var] = i
+            for child in node.children[3:]:
+                self.visit(child)
+
+    def visit_Print(self, node):
+        self.output.append(self.visit(node.children[0]))
+
+# memory held by the AST, and the time to interpret it -- legacy nodes vs __slots__ nodes
+def bench_ast_nodes(source: str) -> None:
+    tokens = Lexer(source).get_tokens()
+    tree, tree_size, _ = measure(lambda: ASTParser(tokens, source).parse())
+    legacy, legacy_size, _ = measure(lambda: to_legacy(tree))
+    timings, results = [], []
+    for interpreter, root in ((LegacyInterpreter(), legacy), (Interpreter(), tree)):
+        begin = time.perf_counter()
+        status, output, variables = interpreter.interpret(root)
+        timings.append(time.perf_counter() - begin)
+        results.append((status, list(output), dict(variables)))
+    assert results[0] == results[1], "the legacy and __slots__ trees interpret differently"
+    assert results[1][0] == "success" and results[1][1], "the program printed nothing"
+    print(f"legacy AST        : {legacy_size:>12,} bytes  interpret {timings[0]:.3f}s")
+    print(f"__slots__ AST     : {tree_size:>12,} bytes  interpret {timings[1]:.3f}s")
+    print(f"ratio             : {legacy_size / tree_size:.1f}x smaller, {timings[0] / timings[1]:.2f}x faster")
+
+# memory held by the AST -- __slots__ nodes vs the flat arena, and the time to interpret through arena cursors
+def bench_ast_arena(source: str) -> None:
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    _, tree_size, _ = measure(lambda: ASTParser(Lexer(source).get_tokens(), source).parse())
+    arena, arena_size, build_time = measure(lambda: ASTArena(tree))
+    timings = []
+    for root in (tree, arena.root()):
+        begin = time.perf_counter()
+        Interpreter().interpret(root)
+        timings.append(time.perf_counter() - begin)
+    print(f"__slots__ AST     : {tree_size:>12,} bytes  interpret {timings[0]:.3f}s")
+    print(f"arena AST         : {arena_size:>12,} bytes  interpret {timings[1]:.3f}s  ({len(arena):,} nodes, "
+          f"{len(arena.constants):,} constants, built in {build_time:.3f}s)")
+    print(f"ratio             : {tree_size / arena_size:.1f}x smaller")
+
+# lexing + parsing vs loading the AST from the parse cache
+def bench_parse_cache(source: str) -> None:
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ParseCache(directory)
+        begin = time.perf_counter()
+        cache.parse(source) # a miss -- parsed and stored
+        parse_time = time.perf_counter() - begin
+        begin = time.perf_counter()
+        cache.parse(source) # a hit
+        load_time = time.perf_counter() - begin
+        print(f"parse + store     : {parse_time:.3f}s")
+        print(f"load from cache   : {load_time:.3f}s  ({cache.size:,} bytes on disk)")
+        print(f"ratio             : {parse_time / load_time:.1f}x faster")
+
+# memory held by the AST with and without hash-consing, and how much it shared
+def bench_hash_consing(source: str) -> None:
+    tokens = Lexer(source).get_tokens()
+    _, tree_size, tree_time = measure(lambda: ASTParser(tokens, source).parse())
+    parser = ASTParser(tokens, source, hash_cons=True)
+    _, shared_size, shared_time = measure(parser.parse)
+    print(f"AST               : {tree_size:>12,} bytes  {tree_time:.3f}s")
+    print(f"hash-consed AST   : {shared_size:>12,} bytes  {shared_time:.3f}s  (table included)")
+    print(f"sharing           : {parser.interner.report()}")
+
+# analysis and interpretation of one very deep expression -- a chain of additions nests one level per term
+def bench_deep_expression(terms: int = 100_000) -> None:
+    source = "program\nx = " + " + ".join(["1"] * terms) + ";\nprint(x);\nend_program\n"
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    begin = time.perf_counter()
+    SemanticAnalyzer().analyze(tree)
+    analyzed = time.perf_counter()
+    status, output, _ = Interpreter().interpret(tree)
+    interpreted = time.perf_counter()
+    print(f"{terms:,} deep expression: analyzed in {analyzed - begin:.3f}s, interpreted in {interpreted - analyzed:.3f}s "
+          f"({status}, {output[0] if output else None})")
+
+# nested ifs and parentheses from source text, through the parser, analyzer and interpreter
+def bench_deep_nesting(depth: int = 20_000) -> None:
+    source = ("program\nx = " + "(" * depth + "1" + ")" * depth + ";\n" + "if (x > 0)\n" * depth + "print(x);\n" +
+              "end_if\n" * depth + "end_program\n")
+    begin = time.perf_counter()
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    parsed = time.perf_counter()
+    SemanticAnalyzer().analyze(tree)
+    analyzed = time.perf_counter()
+    status, output, _ = Interpreter().interpret(tree)
+    interpreted = time.perf_counter()
+    assert status == 'success' and output == [1], (status, output)
+    print(f"{depth:,} nested ifs and parentheses: parsed in {parsed - begin:.3f}s, analyzed in {analyzed - parsed:.3f}s, "
+          f"interpreted in {interpreted - analyzed:.3f}s")
+
+# semantic analysis of many variables under a deep loop nest -- entering and leaving a loop scope
+def bench_symbol_scopes(variables: int = 20_000, depth: int = 150) -> None:
+    assignments = "\n".join(f"v{i} = {i};" for i in range(variables))
+    loops = "".join(f"loop (i{d} = 1 : 2)\n" for d in range(depth))
+    source = f"program\n{assignments}\n{loops}print(v0);\n" + "end_loop\n" * depth + "end_program\n"
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    begin = time.perf_counter()
+    analyzer = SemanticAnalyzer()
+    analyzer.analyze(tree)
+    print(f"{variables:,} variables, {depth} nested loops: analyzed in {time.perf_counter() - begin:.3f}s "
+          f"({len(analyzer.symbol_table):,} symbols)")
+
+# full semantic analysis vs analysis again after a one-character edit in the middle of the program
+def bench_incremental_analysis(source: str) -> None:
+    parser, analyzer = IncrementalParser(), IncrementalAnalyzer()
+    tree = parser.parse(source)
+    begin = time.perf_counter()
+    SemanticAnalyzer().analyze(tree)
+    full = time.perf_counter() - begin
+    analyzer.analyze(tree)
+    position = source.index(" 1", len(source) // 2) + 1 # a literal half-way through
+    tree = parser.parse(source[:position] + "7" + source[position + 1:])
+    begin = time.perf_counter()
+    analyzer.analyze(tree)
+    elapsed = time.perf_counter() - begin
+    print(f"full analysis     : {full:.3f}s")
+    print(f"after an edit     : {elapsed:.3f}s  ({analyzer.analyzed:,} statements analyzed, {analyzer.reused:,} replayed)")
+
+# type inference and constant propagation over the scaled program -- linear in its size
+def bench_dataflow(source: str) -> None:
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    begin = time.perf_counter()
+    analyzer = DataflowAnalyzer().analyze(tree)
+    print(f"dataflow          : {time.perf_counter() - begin:.3f}s  ({len(analyzer.types):,} expressions typed, "
+          f"{len(analyzer.constants):,} constant)")
+
+# interpretation of the scaled program as parsed and after the optimizer
+def bench_optimizer(source: str) -> None:
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    begin = time.perf_counter()
+    optimizer = Optimizer()
+    optimized = optimizer.optimize(tree)
+    optimize_time = time.perf_counter() - begin
+    timings = []
+    for program in (tree, optimized):
+        begin = time.perf_counter()
+        Interpreter().interpret(program)
+        timings.append(time.perf_counter() - begin)
+    print(f"optimize          : {optimize_time:.3f}s  ({optimizer.summary()})")
+    print(f"interpret         : {timings[0]:.3f}s as parsed, {timings[1]:.3f}s optimized")
+
+if __name__ == '__main__':
+    times = int(sys.argv[1]) if len(sys.argv) > 1 else 1000 # how many copies of the program body
+    source = scaled_program("program1.txt", times)
+    bench_token_memory(source)
+    bench_parallel_lexing(source)
+    bench_parsing(source)
+    bench_incremental_parsing(source)
+    bench_ast_nodes(source)
+    bench_ast_arena(source)
+    bench_parse_cache(source)
+    bench_hash_consing(source)
+    bench_deep_expression()
+    bench_deep_nesting()
+    bench_symbol_scopes()
+    bench_incremental_analysis(source)
+    bench_dataflow(source)
+    bench_optimizer(source)
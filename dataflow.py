@@ -0,0 +1,330 @@
+import operator
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from AST_Tree import PURE_KINDS, ASTNode, NodeKind
+from traversal import Evaluator, StatementRunner, preorder
+
+# types of values -- the names SemanticAnalyzer uses, and ANY for a value whose type is not known
+INT, STRING, BOOL, ANY = 'int', 'string', 'bool', 'any'
+MAX_STRING = 10_000 # longer strings are not folded into constants
+
+
+# a value that is not known before the program runs
+class Unknown:
+    def __repr__(self) -> str:
+        return "UNKNOWN"
+
+UNKNOWN = Unknown()
+MISSING = object() # no entry, on the undo log
+
+# type of a value
+def type_of(value) -> str:
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, str):
+        return STRING
+    return ANY
+
+# one type for two -- None is a type not known yet, from a variable with no assignment seen so far
+def join(first: Optional[str], second: Optional[str]) -> Optional[str]:
+    if first is None or first == second:
+        return second
+    return first if second is None else ANY
+
+# the same constant -- 1 and True are equal in Python, but not the same value here
+def same(first, second) -> bool:
+    return type(first) is type(second) and first == second
+
+# type of an operator's result, from the types of its operands
+def result_type(kind: NodeKind, op: str, left: Optional[str], right: Optional[str]) -> Optional[str]:
+    if left is None or right is None:
+        return None
+    if kind == NodeKind.RelOp:
+        return BOOL
+    if kind == NodeKind.LogicOp:
+        return BOOL if left == right == BOOL else ANY # && and || give one of their operands
+    if kind != NodeKind.BinOp:
+        return ANY
+    numbers = (INT, BOOL)
+    if left in numbers and right in numbers:
+        return INT
+    if op == '+' and left == right == STRING:
+        return STRING
+    if op == '*' and (left == STRING and right in numbers or right == STRING and left in numbers):
+        return STRING
+    return ANY
+
+ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul, '%': operator.mod}
+RELATIONS = {'==': operator.eq, '!=': operator.ne, '>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le}
+
+# the value the interpreter gives an operator on two known values -- UNKNOWN where it would raise a runtime error
+def fold(kind: NodeKind, op: str, left, right):
+    try:
+        if kind == NodeKind.BinOp:
+            if op == '/':
+                return UNKNOWN if right == 0 else left // right
+            if op == '*' and (isinstance(left, str) or isinstance(right, str)):
+                text, times = (left, right) if isinstance(left, str) else (right, left)
+                if len(text) * times > MAX_STRING:
+                    return UNKNOWN
+            if op == '+' and isinstance(left, str) and isinstance(right, str) and len(left) + len(right) > MAX_STRING:
+                return UNKNOWN
+            return ARITHMETIC[op](left, right) if op in ARITHMETIC else UNKNOWN
+        if kind == NodeKind.RelOp:
+            return RELATIONS[op](left, right) if op in RELATIONS else UNKNOWN
+        if kind == NodeKind.LogicOp:
+            if op == '&&':
+                return left and right
+            if op == '||':
+                return left or right
+    except (TypeError, ValueError, ZeroDivisionError, OverflowError):
+        pass
+    return UNKNOWN
+
+
+# known values of variables at one point of the program, with nested scopes for code that may not run. Every
+# change made while a scope is open goes on an undo log with the value it replaced, so leaving a scope costs
+# O(changes in it): the old values come back, or (merged) a variable keeps its value only if both paths agree
+class Environment:
+    def __init__(self):
+        self.values: Dict[str, Any] = {} # name -> constant, or UNKNOWN
+        self.changes: List[Tuple[str, Any]] = [] # undo log: (name, value before), innermost scope last
+        self.scopes: List[int] = [] # where each open scope starts on the undo log
+
+    def get(self, name: str):
+        return self.values.get(name, UNKNOWN)
+
+    def set(self, name: str, value) -> None:
+        if self.scopes:
+            self.changes.append((name, self.values.get(name, MISSING)))
+        self.values[name] = value
+
+    def enter(self) -> None:
+        self.scopes.append(len(self.changes))
+
+    # leave the innermost scope -- undone, or merged with the values from before it (the code in it may not have run)
+    def leave(self, merge: bool) -> None:
+        start = self.scopes.pop()
+        before: Dict[str, Any] = {}
+        for name, value in self.changes[start:]:
+            before.setdefault(name, value) # the first change has the value from before the scope
+        del self.changes[start:]
+        values = self.values
+        for name, value in before.items():
+            current = values[name]
+            if value is MISSING:
+                del values[name]
+            else:
+                values[name] = value
+            if merge:
+                self.set(name, current if value is not MISSING and same(current, value) else UNKNOWN)
+
+
+# infers a type for every expression node and the constant value of the ones that have one, following known
+# values through assignments, if conditions and loop bounds. The results are side tables keyed by node:
+#   types[node] -- INT, STRING, BOOL or ANY
+#   constants[node] -- the value, for nodes whose value is the same every time they run
+#   bounds[loop] -- (start, end) for loops with constant bounds
+# A variable's type is the join of everything assigned to it (flow-insensitive, from a worklist over the assignments);
+# constants are flow-sensitive: one pass over the statements, a loop body analyzed once with the variables it assigns
+# unknown. Both are linear in the size of the tree. A shared (hash-consed) node is constant only if it has the same
+# value everywhere it appears
+class DataflowAnalyzer:
+    def __init__(self):
+        self.types: Dict[ASTNode, str] = {}
+        self.constants: Dict[ASTNode, Any] = {}
+        self.bounds: Dict[ASTNode, Tuple[int, int]] = {}
+        self.variable_types: Dict[str, str] = {} # name -> type of every value it is assigned
+        self.environment = Environment()
+        self.varying: Set[ASTNode] = set() # nodes seen with different or unknown values
+        self.assigned: Dict[ASTNode, Set[str]] = {} # loop -> names assigned in its body
+        self.operators = {kind: getattr(self, f"value_{kind}", self.value_unknown) for kind in PURE_KINDS}
+        self.evaluator = Evaluator(self.operators) # (type, constant) of an expression
+        self.typer = Evaluator({kind: getattr(self, f"type_{kind}", self.type_unknown) for kind in PURE_KINDS})
+        visitors = {kind: self.generic_visit for kind in NodeKind}
+        visitors.update({kind: getattr(self, f"visit_{kind}") for kind in
+                         (NodeKind.Program, NodeKind.Assign, NodeKind.Print, NodeKind.If, NodeKind.Loop)})
+        self.runner = StatementRunner(visitors)
+
+    # analyze a program (or a statement) -- the tables are filled, and self is returned
+    def analyze(self, node: ASTNode) -> "DataflowAnalyzer":
+        self.collect(node)
+        self.runner.run((node,))
+        return self
+
+    # type of an expression node, ANY if it was not analyzed
+    def type_of(self, node: ASTNode) -> str:
+        return self.types.get(node, ANY)
+
+    # constant value of an expression node, default if it has none
+    def constant(self, node: ASTNode, default=UNKNOWN):
+        return self.constants.get(node, default)
+
+    # the assignments and loops of the tree, then the type of every variable
+    def collect(self, root: ASTNode) -> None:
+        assignments: List[Tuple[str, ASTNode]] = [] # (name, expression)
+        loops: List[Tuple[int, Set[str]]] = [] # (depth, names assigned in it) of the loops around a node
+        variable_types = self.variable_types
+        for node, depth, _ in preorder(root):
+            while loops and loops[-1][0] >= depth:
+                loops.pop()
+            kind = node.kind
+            if kind == NodeKind.Assign or kind == NodeKind.Loop:
+                name = node.children[0].value
+                for _, names in loops:
+                    names.add(name)
+                if kind == NodeKind.Assign:
+                    assignments.append((name, node.children[1]))
+                else:
+                    variable_types[name] = join(variable_types.get(name), INT)
+                    loops.append((depth, self.assigned.setdefault(node, set())))
+        # worklist: an assignment is typed again when the type of a variable it reads goes up -- at most twice
+        # per variable (to its first type, then to ANY)
+        readers: Dict[str, List[int]] = {}
+        for index, (_, expression) in enumerate(assignments):
+            for name in {node.value for node, _, _ in preorder(expression) if node.kind == NodeKind.Var}:
+                readers.setdefault(name, []).append(index)
+        work = list(range(len(assignments)))
+        while work:
+            name, expression = assignments[work.pop()]
+            old = variable_types.get(name)
+            new = join(old, self.typer.evaluate(expression))
+            if new != old:
+                variable_types[name] = new
+                work.extend(readers.get(name, ()))
+
+    # record what an expression node evaluated to here
+    def record(self, node: ASTNode, type: str, value) -> Tuple[str, Any]:
+        types = self.types
+        known = types.get(node)
+        types[node] = type if known is None else join(known, type)
+        if node not in self.varying:
+            if value is UNKNOWN:
+                self.varying.add(node)
+                self.constants.pop(node, None)
+            else:
+                constant = self.constants.setdefault(node, value)
+                if not same(constant, value):
+                    self.varying.add(node)
+                    del self.constants[node]
+        return type, value
+
+    # (type, constant) of an expression
+    def evaluate(self, node: ASTNode) -> Tuple[str, Any]:
+        return self.evaluator.evaluate(node)
+
+# types of expressions from the variable types alone -- None while a variable's type is not known yet
+    def type_Var(self, node: ASTNode) -> Optional[str]:
+        return self.variable_types.get(node.value)
+
+    def type_Int(self, node: ASTNode) -> str:
+        return INT
+
+    def type_String(self, node: ASTNode) -> str:
+        return STRING
+
+    def type_BinOp(self, node: ASTNode, left, right) -> Optional[str]:
+        return result_type(node.kind, node.value, left, right)
+
+    type_LogicOp = type_RelOp = type_BinOp
+
+    def type_unknown(self, node: ASTNode, *children) -> str:
+        return ANY
+
+# (type, constant) of expressions, recorded on the way
+    def value_Var(self, node: ASTNode):
+        value = self.environment.get(node.value)
+        if value is UNKNOWN:
+            return self.record(node, self.variable_types.get(node.value, ANY), UNKNOWN)
+        return self.record(node, type_of(value), value)
+
+    def value_Int(self, node: ASTNode):
+        return self.record(node, INT, node.value)
+
+    def value_String(self, node: ASTNode):
+        return self.record(node, STRING, node.value)
+
+    def value_BinOp(self, node: ASTNode, left, right):
+        value = UNKNOWN
+        if left[1] is not UNKNOWN and right[1] is not UNKNOWN:
+            value = fold(node.kind, node.value, left[1], right[1])
+        type = result_type(node.kind, node.value, left[0], right[0])
+        return self.record(node, type_of(value) if value is not UNKNOWN else type, value)
+
+    value_LogicOp = value_RelOp = value_BinOp
+
+    # UnaryOp has no interpreter visitor -- running it fails
+    def value_unknown(self, node: ASTNode, *children):
+        return self.record(node, ANY, UNKNOWN)
+
+# statements
+    def generic_visit(self, node: ASTNode):
+        return None
+
+    def visit_Program(self, node: ASTNode):
+        return (node.children,)
+
+    def visit_Assign(self, node: ASTNode):
+        self.environment.set(node.children[0].value, self.evaluate(node.children[1])[1])
+
+    def visit_Print(self, node: ASTNode):
+        self.evaluate(node.children[0])
+
+    # a constant condition runs its body or skips it -- a skipped body is still analyzed (for its types), then undone
+    def visit_If(self, node: ASTNode):
+        condition = self.evaluate(node.children[0])[1]
+        if condition is UNKNOWN:
+            return self.scoped(node.children[1:], merge=True)
+        if condition:
+            return (node.children[1:],)
+        return self.scoped(node.children[1:], merge=False)
+
+    # a loop body is analyzed once, for every iteration: what it assigns is unknown when it starts
+    def visit_Loop(self, node: ASTNode):
+        loop_var = node.children[0].value
+        start = self.evaluate(node.children[1])[1]
+        end = self.evaluate(node.children[2])[1]
+        body = node.children[3:]
+        if type_of(start) in (INT, BOOL) and type_of(end) in (INT, BOOL):
+            self.bounds[node] = (start, end)
+            if start > end:
+                return self.scoped(body, merge=False) # never runs
+            return self.iterations(node, loop_var, start, end, body)
+        return self.scoped(body, merge=True, loop=node)
+
+    # a body that runs at least once -- the loop variable ends at end, unless the body assigns it
+    def iterations(self, node: ASTNode, loop_var: str, start: int, end: int, body: Sequence[ASTNode]):
+        environment = self.environment
+        for name in self.assigned[node]:
+            environment.set(name, UNKNOWN)
+        environment.set(loop_var, start if start == end else UNKNOWN)
+        yield body
+        if loop_var not in self.assigned[node]:
+            environment.set(loop_var, end)
+
+    # a body that may not run (merge) or does not run at all -- analyzed in a scope
+    def scoped(self, body: Sequence[ASTNode], merge: bool, loop: Optional[ASTNode] = None):
+        environment = self.environment
+        environment.enter()
+        if loop is not None:
+            for name in self.assigned[loop]:
+                environment.set(name, UNKNOWN)
+            environment.set(loop.children[0].value, UNKNOWN)
+        yield body
+        environment.leave(merge)
+
+
+# the constant expressions of a program file
+if __name__ == "__main__":
+    import sys
+    from lexer import Lexer
+    from AST_Tree import ASTParser
+
+    with open(sys.argv[1]) as file:
+        source = file.read()
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    analyzer = DataflowAnalyzer().analyze(tree)
+    for node, depth, _ in preorder(tree):
+        if node in analyzer.constants and node.children:
+            print(f"{'  ' * depth}{node.kind} {node.value!r}: {analyzer.type_of(node)} = {analyzer.constants[node]!r}")
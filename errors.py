@@ -16,11 +16,97 @@ class ParserError(LanGUError):
             error_msg += f": found '{lexeme}'"
         error_msg += f": {message}"
         super().__init__(error_msg)
+        # keep the position so callers don't have to parse it back out of the message
+        self.line = line
+        self.column = column
+
+# " (at line 3, column 5)" -- where a semantic / runtime error or warning is
+def where(line, column=None):
+    return f" (at line {line}, column {column})" if column else f" (at line {line})"
+
+# errors about a node of the AST, carrying its line and column. AST node lines are relative (see ASTNode), so an
+# error can be raised with a line relative to its statement: each statement list it passes on the way out adds
+# its offset (shift), and the program node makes the line absolute (anchor)
+class LocatedError(LanGUError):
+    def __init__(self, message, line=None, column=None, relative=False):
+        super().__init__(message)
+        self.message = message
+        self.line = None if relative else line # absolute line, once known
+        self.offset = line if relative else None # line relative to the statement lists passed so far
+        self.column = column or None
+
+    # add the offset of an enclosing statement
+    def shift(self, lines):
+        if self.offset is not None:
+            self.offset += lines
+
+    # the program starts at line -- the line is absolute from now on
+    def anchor(self, line):
+        if self.offset is not None:
+            self.line, self.offset = line + self.offset, None
+
+    def __str__(self):
+        return self.message + where(self.line, self.column) if self.line is not None else self.message
 
 # semantic errors
-class SemanticError(LanGUError):
+class SemanticError(LocatedError):
     pass
 
 # interpreter errors
-class InterpreterError(LanGUError):
+class InterpreterError(LocatedError):
     pass
+
+# diagnostic codes, and the message each one is shown with
+USED_BEFORE_ASSIGNMENT = "used-before-assignment"
+UNUSED_VARIABLE = "unused-variable"
+UNUSED_LOOP_VARIABLE = "unused-loop-variable"
+MESSAGES = {
+    USED_BEFORE_ASSIGNMENT: "Warning: Variable '{}' used before assignment.",
+    UNUSED_VARIABLE: "Warning: Variable '{}' assigned but never used.",
+    UNUSED_LOOP_VARIABLE: "Warning: Loop variable '{}' declared but never used.",
+}
+WARNING = "warning"
+
+# a finding that does not stop analysis -- the message is only built when it is shown
+class Diagnostic:
+    __slots__ = ("code", "severity", "variable", "line", "column")
+
+    def __init__(self, code, variable, line, column=None, severity=WARNING):
+        self.code = code
+        self.severity = severity
+        self.variable = variable
+        self.line = line
+        self.column = column
+
+    @property
+    def message(self):
+        return MESSAGES[self.code].format(self.variable)
+
+    def __str__(self):
+        return self.message + where(self.line, self.column)
+
+    def __repr__(self):
+        return f"Diagnostic({self.code!r}, {self.variable!r}, {self.line}, {self.column}, {self.severity!r})"
+
+# diagnostics in the order they were found, and indexed by code
+class Diagnostics:
+    def __init__(self):
+        self.found = []
+        self.by_code = {} # code -> its diagnostics, in order
+
+    def add(self, diagnostic):
+        self.found.append(diagnostic)
+        by_code = self.by_code.get(diagnostic.code)
+        if by_code is None:
+            by_code = self.by_code[diagnostic.code] = []
+        by_code.append(diagnostic)
+
+    # the diagnostics with a code
+    def of(self, code):
+        return self.by_code.get(code, [])
+
+    def __iter__(self):
+        return iter(self.found)
+
+    def __len__(self):
+        return len(self.found)
@@ -0,0 +1,254 @@
+import re
+from typing import Dict, FrozenSet, List, Set, Tuple
+from lexer import TokenType, scan
+# cSpell:ignore nonterminal nonterminals
+
+
+# the LanGU grammar in EBNF -- the parse table below is compiled from this text once, at import, and the parser
+# (parser.py) takes its token groups and its choice between alternatives from it
+#   "x"   a keyword or symbol, its token type comes from the lexer
+#   NAME  a token class, by TokenType name
+#   { } repeat, [ ] optional, ( ) group, | alternatives
+# when two alternatives can start with the same token the earlier one wins, which is how "(" at the start of a
+# <logic_expr> always opens a nested logical expression and never a parenthesized arithmetic operand
+GRAMMAR = """
+program         = "program" statements "end_program" ;
+statements      = { statement } ;
+statement       = assignment ";" | if_statement [ ";" ] | loop_statement [ ";" ] | print_statement ";" ;
+assignment      = var "=" expr ;
+if_statement    = "if" "(" logic_expr ")" statements "end_if" ;
+loop_statement  = "loop" "(" var "=" bound ":" bound ")" statements "end_loop" ;
+bound           = INT_LIT | var ;
+print_statement = "print" "(" expr ")" ;
+logic_expr      = "(" logic_expr ")" [ logic_op logic_expr ] | rel_expr { logic_op rel_expr } ;
+logic_op        = "&&" | "||" ;
+rel_expr        = expr rel_op expr ;
+rel_op          = "==" | "!=" | ">" | "<" | ">=" | "<=" ;
+expr            = term { add_op term } ;
+add_op          = "+" | "-" ;
+term            = factor { mul_op factor } ;
+mul_op          = "*" | "/" | "%" ;
+factor          = "-" factor | var | INT_LIT | STRING_LIT | "(" expr ")" ;
+var             = IDENT ;
+"""
+
+EOF = 0 # terminal code for the end of the input, every other terminal is its TokenType value
+EBNF_TOKEN = re.compile(r'\s*(?:("[^"]*")|([A-Za-z_][A-Za-z0-9_]*)|(\S))')
+
+
+# an EBNF grammar compiled into BNF productions, FIRST / FOLLOW sets and an LL(1) parse table.
+# symbols are ints: a terminal is its code (>= 0), a nonterminal is ~index (< 0)
+class Grammar:
+    def __init__(self, text: str, start: str = "program"):
+        self.names: List[str] = [] # nonterminal names, by index
+        self.index: Dict[str, int] = {} # nonterminal name -> index
+        self.productions: List[Tuple[int, Tuple[int, ...]]] = [] # (nonterminal index, right-hand side)
+        self.width = max(token_type.value for token_type in TokenType) + 1 # terminal codes per table row
+        self.compile(text)
+        self.start = self.index[start]
+        self.nullable: Set[int] = set() # nonterminals that can derive nothing
+        self.first: List[Set[int]] = [set() for _ in self.names] # FIRST set of each nonterminal
+        self.follow: List[Set[int]] = [set() for _ in self.names] # FOLLOW set of each nonterminal
+        self.compute_first()
+        self.compute_follow()
+        self.table: List[int] = [] # row * width + code -> production number, -1 for none
+        self.conflicts: List[str] = [] # cells where an earlier alternative won
+        self.build_table()
+
+# EBNF -> BNF
+    # read every rule, then check that each name it uses is defined
+    def compile(self, text: str) -> None:
+        self.tokens = [match.group(match.lastindex) for match in EBNF_TOKEN.finditer(text.strip())]
+        self.position = 0
+        while self.position < len(self.tokens):
+            name = self.take()
+            self.expect("=")
+            index = self.nonterminal(name)
+            self.pending = name # helper rules are named after the rule they are in
+            self.helpers = 0
+            alternatives = self.alternatives()
+            self.expect(";")
+            self.productions.extend((index, rhs) for rhs in alternatives)
+        undefined = [name for name in self.names if not any(index == self.index[name] for index, _ in self.productions)]
+        if undefined:
+            raise ValueError(f"Grammar uses undefined rules: {', '.join(undefined)}")
+        del self.tokens, self.position, self.pending, self.helpers
+
+    # next EBNF token
+    def take(self) -> str:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    # the next EBNF token must be this one
+    def expect(self, token: str) -> None:
+        if self.position >= len(self.tokens) or self.take() != token:
+            raise ValueError(f"Grammar: expecting '{token}' in rule '{self.pending}'")
+
+    # index of a nonterminal, added on first use
+    def nonterminal(self, name: str) -> int:
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        return self.index[name]
+
+    # a new nonterminal for a { }, [ ] or ( ) inside the current rule
+    def helper(self, alternatives: List[Tuple[int, ...]]) -> int:
+        self.helpers += 1
+        index = self.nonterminal(f"{self.pending}#{self.helpers}")
+        for rhs in alternatives:
+            self.productions.append((index, rhs))
+        return ~index
+
+    # sequence { "|" sequence }
+    def alternatives(self) -> List[Tuple[int, ...]]:
+        alternatives = [self.sequence()]
+        while self.position < len(self.tokens) and self.tokens[self.position] == "|":
+            self.position += 1
+            alternatives.append(self.sequence())
+        return alternatives
+
+    # { item }
+    def sequence(self) -> Tuple[int, ...]:
+        symbols = []
+        while self.position < len(self.tokens) and self.tokens[self.position] not in ("|", ";", ")", "]", "}"):
+            token = self.take()
+            # a keyword or symbol -- ask the lexer what it is
+            if token.startswith('"'):
+                lexed = list(scan(token[1:-1]))
+                if len(lexed) != 1:
+                    raise ValueError(f"Grammar: {token} is not a single token")
+                symbols.append(lexed[0].token_type.value)
+            # a token class
+            elif token.isupper():
+                symbols.append(TokenType[token].value)
+            # a rule
+            elif token[0].isalpha() or token[0] == "_":
+                symbols.append(~self.nonterminal(token))
+            # X* as  N -> X N | <empty>
+            elif token == "{":
+                body = self.alternatives()
+                self.expect("}")
+                loop = self.helper([])
+                self.productions.extend((~loop, rhs + (loop,)) for rhs in body)
+                self.productions.append((~loop, ()))
+                symbols.append(loop)
+            # X? as  N -> X | <empty>
+            elif token == "[":
+                body = self.alternatives()
+                self.expect("]")
+                symbols.append(self.helper(body + [()]))
+            # (X | Y) as  N -> X | Y
+            elif token == "(":
+                body = self.alternatives()
+                self.expect(")")
+                symbols.append(self.helper(body))
+            else:
+                raise ValueError(f"Grammar: unexpected '{token}' in rule '{self.pending}'")
+        return tuple(symbols)
+
+# FIRST / FOLLOW
+    # FIRST of a string of symbols, and whether it can derive nothing
+    def first_of(self, symbols: Tuple[int, ...]) -> Tuple[Set[int], bool]:
+        first: Set[int] = set()
+        for symbol in symbols:
+            if symbol >= 0:
+                first.add(symbol)
+                return first, False
+            first |= self.first[~symbol]
+            if ~symbol not in self.nullable:
+                return first, False
+        return first, True
+
+    # grow the FIRST sets until nothing changes
+    def compute_first(self) -> None:
+        changed = True
+        while changed:
+            changed = False
+            for index, rhs in self.productions:
+                first, nullable = self.first_of(rhs)
+                if not first <= self.first[index]:
+                    self.first[index] |= first
+                    changed = True
+                if nullable and index not in self.nullable:
+                    self.nullable.add(index)
+                    changed = True
+
+    # grow the FOLLOW sets until nothing changes
+    def compute_follow(self) -> None:
+        self.follow[self.start].add(EOF)
+        changed = True
+        while changed:
+            changed = False
+            for index, rhs in self.productions:
+                for position, symbol in enumerate(rhs):
+                    if symbol >= 0:
+                        continue
+                    first, nullable = self.first_of(rhs[position + 1:])
+                    if nullable:
+                        first = first | self.follow[index]
+                    if not first <= self.follow[~symbol]:
+                        self.follow[~symbol] |= first
+                        changed = True
+
+    # one cell per (nonterminal, lookahead) -- the first production to claim a cell keeps it
+    def build_table(self) -> None:
+        self.table = [-1] * (len(self.names) * self.width)
+        owners: Dict[int, int] = {} # cell -> production number
+        for number, (index, rhs) in enumerate(self.productions):
+            first, nullable = self.first_of(rhs)
+            if nullable:
+                first |= self.follow[index]
+            for code in first:
+                cell = index * self.width + code
+                if cell in owners:
+                    self.conflicts.append(f"{self.names[index]} on {self.terminal_name(code)}: "
+                                          f"kept {self.show(owners[cell])}, dropped {self.show(number)}")
+                    continue
+                owners[cell] = number
+                self.table[cell] = number
+
+# names
+    # a terminal code as text
+    def terminal_name(self, code: int) -> str:
+        return "end of input" if code == EOF else TokenType(code).name
+
+    # a production as text
+    def show(self, number: int) -> str:
+        index, rhs = self.productions[number]
+        symbols = [self.terminal_name(symbol) if symbol >= 0 else self.names[~symbol] for symbol in rhs]
+        return f"{self.names[index]} -> {' '.join(symbols) or '<empty>'}"
+
+# lookups for the parser
+    # the alternative of a rule the table picks for each terminal code, numbered from 0 in the order they are
+    # written, -1 where none applies -- index it with token_type.value (EOF at the end of the input)
+    def predict(self, name: str) -> List[int]:
+        index = self.index[name]
+        alternatives = [number for number, (owner, _) in enumerate(self.productions) if owner == index]
+        row = self.table[index * self.width:(index + 1) * self.width]
+        return [alternatives.index(number) if number >= 0 else -1 for number in row]
+
+    # FIRST set of a rule, as token types
+    def first_set(self, name: str) -> FrozenSet[TokenType]:
+        return frozenset(TokenType(code) for code in self.first[self.index[name]])
+
+    # FOLLOW set of a rule, as token types (the end of the input is left out)
+    def follow_set(self, name: str) -> FrozenSet[TokenType]:
+        return frozenset(TokenType(code) for code in self.follow[self.index[name]] if code != EOF)
+
+
+LANGU = Grammar(GRAMMAR) # compiled once
+
+
+
+# the compiled grammar -- its productions, FIRST / FOLLOW sets and conflicts
+if __name__ == "__main__":
+    for number in range(len(LANGU.productions)):
+        print(LANGU.show(number))
+    print()
+    for name in LANGU.names:
+        first = " ".join(sorted(token_type.name for token_type in LANGU.first_set(name)))
+        follow = " ".join(sorted(token_type.name for token_type in LANGU.follow_set(name)))
+        print(f"{name}\n  FIRST  {first}\n  FOLLOW {follow}")
+    print()
+    print("\n".join(LANGU.conflicts) or "no conflicts")
@@ -1,6 +1,13 @@
+import mmap
+import os
 import re
+import sys
 from enum import Enum, auto
-from typing import List, Tuple, Optional
+from array import array
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 # cSpell:ignore MULT_OP
 
 
@@ -37,6 +44,10 @@ class TokenType(Enum):
     COMMENT = auto()
     UNKNOWN = auto()
 
+    # members are singletons compared by identity, so hash them by identity too --
+    # Enum's own __hash__ runs in Python and shows up in every token-type table lookup
+    __hash__ = object.__hash__
+
 TOKEN_PATTERNS: List[Tuple[re.Pattern, TokenType]] = [
     (re.compile(r'//.*'), TokenType.COMMENT),
     (re.compile(r'\|\|'), TokenType.LOGICAL_OR),
@@ -47,13 +58,6 @@ TOKEN_PATTERNS: List[Tuple[re.Pattern, TokenType]] = [
     (re.compile(r'<='), TokenType.LESS_EQ),
     (re.compile(r'>'), TokenType.GREATER_THAN),
     (re.compile(r'<'), TokenType.LESS_THAN),
-    (re.compile(r'\bprogram\b'), TokenType.PROGRAM),
-    (re.compile(r'\bend_program\b'), TokenType.END_P),
-    (re.compile(r'\bif\b'), TokenType.IF_STMT),
-    (re.compile(r'\bend_if\b'), TokenType.END_IF),
-    (re.compile(r'\bloop\b'), TokenType.LOOP),
-    (re.compile(r'\bend_loop\b'), TokenType.END_LOOP),
-    (re.compile(r'\bprint\b'), TokenType.PRINT),
     (re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b'), TokenType.IDENT),
     (re.compile(r'"[^"\n]*"'), TokenType.STRING_LIT),
     (re.compile(r'-?\d+'), TokenType.INT_LIT),
@@ -69,9 +73,46 @@ TOKEN_PATTERNS: List[Tuple[re.Pattern, TokenType]] = [
     (re.compile(r':'), TokenType.COLON),
 ]
 
+# keywords are matched as identifiers and then looked up by their lexeme
+KEYWORDS = {
+    "program": TokenType.PROGRAM,
+    "end_program": TokenType.END_P,
+    "if": TokenType.IF_STMT,
+    "end_if": TokenType.END_IF,
+    "loop": TokenType.LOOP,
+    "end_loop": TokenType.END_LOOP,
+    "print": TokenType.PRINT,
+}
+
+# single master pattern -- one named group per token type, tried in the same order as TOKEN_PATTERNS.
+# white-space and unknown characters get their own groups so every position is matched exactly once
+MASTER_PATTERN: re.Pattern = re.compile(
+    "|".join(f"(?P<{token_type.name}>{regex.pattern})" for regex, token_type in TOKEN_PATTERNS)
+    + r"|(?P<WHITESPACE>\s+)|(?P<UNKNOWN>\S)"
+)
+
+# map each group name back to its token type
+GROUP_TYPES = {token_type.name: token_type for _, token_type in TOKEN_PATTERNS}
+GROUP_TYPES["UNKNOWN"] = TokenType.UNKNOWN
+
+# the same master pattern over bytes, for lexing memory-mapped files.
+# bytes patterns are ASCII-only: \s and \b only know ASCII, and a non-ASCII character becomes one UNKNOWN token per byte
+BYTES_MASTER_PATTERN: re.Pattern = re.compile(MASTER_PATTERN.pattern.encode("ascii"))
+
+# token types indexed by their value -- used to decode the compact TokenBuffer columns
+TOKEN_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+# default read size for streaming
+CHUNK_SIZE = 1 << 16
+
+# sources smaller than this are lexed in-process by lex_parallel
+PARALLEL_THRESHOLD = 1 << 20
+
 
 # each token has [type, lexeme, line number, starting index]
 class Token:
+    __slots__ = ("token_type", "lexeme", "line", "start") # no per-token __dict__
+
     def __init__(self, token_type: TokenType, lexeme: str, line: int, start: int):
         self.token_type = token_type
         self.lexeme = lexeme # lexeme = the actual text
@@ -84,51 +125,357 @@ class Token:
     def __repr__(self) -> str:
         return self.__str__() # DEBUG
 
+# a fresh table of known words for one lexing run -- each entry is (token type, interned lexeme)
+def new_word_table() -> Dict[str, Tuple[TokenType, str]]:
+    return {keyword: (token_type, keyword) for keyword, token_type in KEYWORDS.items()}
+
+# scan one piece of source text -- line and offset say where the piece starts in the whole program
+def scan(text: str, line: int = 1, offset: int = 0,
+         words: Optional[Dict[str, Tuple[TokenType, str]]] = None) -> Iterator[Token]:
+    group_types = GROUP_TYPES
+    # each distinct word is classified and interned once -- repeated names share one lexeme string
+    if words is None:
+        words = new_word_table()
+
+    # one match per token -- the master pattern covers every character, so the matches are contiguous
+    for match in MASTER_PATTERN.finditer(text):
+        kind = match.lastgroup # name of the group that matched
+        # skip white-space, but catch the newlines
+        if kind == "WHITESPACE":
+            line += match.group().count("\n") # update the line number
+        # identifiers and keywords
+        elif kind == "IDENT":
+            lexeme = match.group()
+            word = words.get(lexeme)
+            # first time we see this word, classify it and intern the lexeme
+            if word is None:
+                word = words[lexeme] = (KEYWORDS.get(lexeme, TokenType.IDENT), sys.intern(lexeme))
+            yield Token(word[0], word[1], line, offset + match.start()) # create the token
+        # comments are dropped
+        elif kind != "COMMENT":
+            yield Token(group_types[kind], match.group(), line, offset + match.start()) # create the token
+
 # lexer to generates tokens
 class Lexer:
     def __init__(self, input_string: str):
         self.input = input_string
         self.tokens: List[Token] = []
+        self.index: Optional[LineIndex] = None # built on first use
         self.tokenize()
 
+    # line-start index of the input, shared by everything that needs a token's column
+    @property
+    def line_index(self) -> "LineIndex":
+        if self.index is None:
+            self.index = LineIndex(self.input)
+        return self.index
+
     # initialization
     def tokenize(self) -> None:
-        position = 0
-        line = 1
+        self.tokens.extend(scan(self.input))
 
-        # while there are characters left to be processed
-        while position < len(self.input):
-            match: Optional[re.Match] = None # no matches yet
-            start_pos = position  # store the tokens starting position
-
-            # for each token try to match it with a pattern
-            for regex, token_type in TOKEN_PATTERNS:
-                match = regex.match(self.input, position)
-                
-                # if we find a match
-                if match:
-                    lexeme = match.group(0) # get the lexeme
-                    line += lexeme.count("\n") # update the line number
-                    # if its not a comment
-                    if token_type != TokenType.COMMENT:
-                        token = Token(token_type, lexeme, line, start_pos) # create a token
-                        self.tokens.append(token) # add it to the list
-                    position += len(lexeme) # increment the position
-                    break # if we found a match break
-
-            # if no match was found, check if the character is whitespace and if so, skip it
-            if not match:
-                # if the character is white-space
-                if self.input[position].isspace():
-                    # catch he newline
-                    if self.input[position] == "\n":
-                        line += 1 # increment the line number
-                    position += 1 # skip the white-space
-                # else, we have an unknown token
-                else:
-                    self.tokens.append(Token(TokenType.UNKNOWN, self.input[position], line, position))
-                    position += 1 # move the position up
-                    
     # generate the tokens
     def get_tokens(self) -> List[Token]:
         return self.tokens
+
+    # stream tokens lazily from a file object or an iterable of text chunks.
+    # no token can cross a newline, so only whole lines are scanned and the partial last line is carried over --
+    # memory stays bounded by the chunk size (or the longest line), not the program size
+    @staticmethod
+    def iter_tokens(source: Union[TextIO, Iterable[str]], chunk_size: int = CHUNK_SIZE) -> Iterator[Token]:
+        # file objects are read in fixed-size chunks, anything else is treated as an iterable of chunks
+        chunks = iter(lambda: source.read(chunk_size), "") if hasattr(source, "read") else iter(source)
+        words = new_word_table() # shared across chunks so names stay interned
+        line = 1
+        offset = 0
+        carry: List[str] = [] # text after the last newline seen so far
+
+        for chunk in chunks:
+            cut = chunk.rfind("\n") + 1
+            # no newline yet -- keep collecting
+            if cut == 0:
+                carry.append(chunk)
+                continue
+            carry.append(chunk[:cut])
+            piece = "".join(carry) # whole lines only
+            carry = [chunk[cut:]]
+            yield from scan(piece, line, offset, words)
+            line += piece.count("\n") # update the line number
+            offset += len(piece) # update the starting index
+
+        # whatever is left after the last newline
+        rest = "".join(carry)
+        if rest:
+            yield from scan(rest, line, offset, words)
+
+
+# compact token storage -- one array('i') column per field instead of one object per token.
+# lexemes are not stored, they are sliced out of the source when a token is read back
+class TokenBuffer:
+    # source is a str, or bytes / an mmap -- then positions are byte offsets and lexemes are decoded when read
+    def __init__(self, source: Union[str, bytes, mmap.mmap], tokenize: bool = True):
+        self.source = source
+        self.types = array("i") # TokenType values
+        self.starts = array("i") # starting index in the source
+        self.lengths = array("i") # lexeme lengths
+        self.lines = array("i") # line numbers
+        self.index: Optional[LineIndex] = None # line-start index, built on first use
+        # lex the whole source, unless the columns are going to be filled some other way
+        if tokenize:
+            self.tokenize(source)
+
+    # append the tokens of text to the columns -- same scan as Lexer, but without creating Token objects.
+    # line and offset say where text starts in the source
+    def tokenize(self, text: Union[str, bytes, mmap.mmap], line: int = 1, offset: int = 0) -> None:
+        types, starts, lengths, lines = self.types, self.starts, self.lengths, self.lines
+        codes = {name: token_type.value for name, token_type in GROUP_TYPES.items()}
+        keyword_codes = {keyword: token_type.value for keyword, token_type in KEYWORDS.items()}
+        ident = TokenType.IDENT.value
+        pattern, newline = MASTER_PATTERN, "\n"
+        # bytes-level scan
+        if not isinstance(text, str):
+            keyword_codes = {keyword.encode("ascii"): code for keyword, code in keyword_codes.items()}
+            pattern, newline = BYTES_MASTER_PATTERN, b"\n"
+
+        for match in pattern.finditer(text):
+            kind = match.lastgroup # name of the group that matched
+            # skip white-space, but catch the newlines
+            if kind == "WHITESPACE":
+                line += match.group().count(newline) # update the line number
+            # comments are dropped
+            elif kind != "COMMENT":
+                start, end = match.span()
+                # keywords are looked up by lexeme
+                types.append(keyword_codes.get(match.group(), ident) if kind == "IDENT" else codes[kind])
+                starts.append(offset + start)
+                lengths.append(end - start)
+                lines.append(line)
+
+    # number of tokens
+    def __len__(self) -> int:
+        return len(self.types)
+
+    # build a Token view for one entry -- views are made on demand and not kept
+    def __getitem__(self, index: int) -> Token:
+        start = self.starts[index] # raises IndexError past the end, like a list
+        return Token(TOKEN_TYPES[self.types[index]], self.lexeme(index), self.lines[index], start)
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.types)):
+            yield self[index]
+
+    # the text of one token -- sliced from the source, and decoded only here when the source is bytes
+    def lexeme(self, index: int) -> str:
+        start = self.starts[index]
+        text = self.source[start:start + self.lengths[index]]
+        return text if isinstance(text, str) else text.decode("utf-8", errors="replace")
+
+    # line-start index of the source
+    @property
+    def line_index(self) -> "LineIndex":
+        if self.index is None:
+            self.index = LineIndex(self.source)
+        return self.index
+
+    # release the memory map, if the buffer was made by lex_file
+    def close(self) -> None:
+        if isinstance(self.source, mmap.mmap):
+            self.source.close()
+
+
+# lex a program file through a read-only memory map, without decoding it into a str first.
+# token starts are byte offsets into the file and lexemes are decoded only when a token is read
+def lex_file(path: str) -> TokenBuffer:
+    with open(path, "rb") as file:
+        # an empty file can't be mapped
+        if os.fstat(file.fileno()).st_size == 0:
+            return TokenBuffer(b"")
+        source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) # stays valid after the file is closed
+    return TokenBuffer(source)
+
+
+# start index of every line, built once per source -- offsets are turned into (line, column) with a binary search.
+# can also cover just a region of the source, starting at a given line
+class LineIndex:
+    def __init__(self, source: Union[str, bytes, mmap.mmap], start: int = 0, end: Optional[int] = None, line: int = 1):
+        end = len(source) if end is None else end
+        newline = "\n" if isinstance(source, str) else b"\n"
+        self.line = line # line number of the first indexed line
+        self.starts = array("q", [start]) # starting index of each line
+        position = source.find(newline, start, end)
+        while position != -1:
+            self.starts.append(position + 1)
+            position = source.find(newline, position + 1, end)
+
+    # (line, column) of an offset -- both as the lexer counts them: lines from 1, columns from 0
+    def position(self, offset: int) -> Tuple[int, int]:
+        row = bisect_right(self.starts, offset) - 1
+        return self.line + row, offset - self.starts[row]
+
+    # column of an offset
+    def column(self, offset: int) -> int:
+        return offset - self.starts[bisect_right(self.starts, offset) - 1]
+
+    # starting index of a line
+    def line_start(self, line: int) -> int:
+        return self.starts[line - self.line]
+
+    # number of indexed lines
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+# lex one shard in a worker process and send back its columns
+def lex_shard(shard: Tuple[str, int, int]) -> Tuple[array, array, array, array]:
+    text, line, offset = shard
+    buffer = TokenBuffer(text, tokenize=False)
+    buffer.tokenize(text, line, offset) # positions are already absolute, so nothing to fix when merging
+    return buffer.types, buffer.starts, buffer.lengths, buffer.lines
+
+# lex a large source in a process pool. the source is cut into line-aligned shards (no token can cross a newline),
+# each shard is told the line and index it starts at, and the columns are concatenated in order.
+# returns a TokenBuffer with the same token stream as Lexer(source)
+def lex_parallel(source: str, workers: Optional[int] = None, shards_per_worker: int = 4) -> TokenBuffer:
+    workers = workers or os.cpu_count() or 1
+    result = TokenBuffer(source, tokenize=False)
+    # not worth starting processes for
+    if workers == 1 or len(source) < PARALLEL_THRESHOLD:
+        result.tokenize(source)
+        return result
+
+    # cut the source into shards that end right after a newline
+    shards: List[Tuple[str, int, int]] = []
+    target = max(1, len(source) // (workers * shards_per_worker)) # rough shard size
+    start = 0
+    line = 1
+    while start < len(source):
+        end = source.find("\n", start + target)
+        end = len(source) if end == -1 else end + 1
+        shards.append((source[start:end], line, start))
+        line += source.count("\n", start, end) # line number where the next shard begins
+        start = end
+
+    # lex the shards and merge their columns
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for types, starts, lengths, lines in pool.map(lex_shard, shards):
+            result.types.extend(types)
+            result.starts.extend(starts)
+            result.lengths.extend(lengths)
+            result.lines.extend(lines)
+    return result
+
+# length of the common prefix of two strings -- compares slices so the work is done in C
+def common_prefix(a: str, b: str) -> int:
+    low, high = 0, min(len(a), len(b))
+    # binary search for the longest equal prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+# length of the common suffix of two strings, at most limit characters
+def common_suffix(a: str, b: str, limit: int) -> int:
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+# lexer for the editor -- keeps the tokens of every line and only re-scans the lines an edit touched.
+# comments and strings never span lines, so a line start is always a safe place to restart
+class IncrementalLexer:
+    def __init__(self, source: str = ""):
+        self.source = ""
+        self.rows: List[List[Tuple[TokenType, str, int]]] = [[]] # (type, lexeme, column) for each line
+        self.words = new_word_table() # kept between edits so names stay interned
+        self.update(source)
+
+    # replace the source and re-lex only what changed.
+    # returns (first changed line, old lines replaced, new lines in their place, tokens of the new lines).
+    # lines start at 1, like Token.line
+    def update(self, source: str) -> Tuple[int, int, int, List[Token]]:
+        old = self.source
+        prefix = common_prefix(old, source)
+        suffix = common_suffix(old, source, min(len(old), len(source)) - prefix)
+
+        # whole lines around the edit -- in the old text and in the new one
+        first = old.count("\n", 0, prefix) # first changed line (0-based)
+        old_last = first + old.count("\n", prefix, len(old) - suffix) # last old line touched
+        start = source.rfind("\n", 0, prefix) + 1 # start of the first changed line
+        end = source.find("\n", len(source) - suffix)
+        if end == -1:
+            end = len(source) # edit is on the last line
+
+        tokens = list(scan(source[start:end], first + 1, start, self.words)) # re-lex the changed lines
+
+        # split the new tokens back into rows, one per line
+        self.line_index = LineIndex(source, start, end, first + 1) # positions of the changed lines
+        rows: List[List[Tuple[TokenType, str, int]]] = [[] for _ in self.line_index.starts]
+        for token in tokens:
+            rows[token.line - first - 1].append((token.token_type, token.lexeme, self.line_index.column(token.start)))
+
+        self.rows[first:old_last + 1] = rows # splice them in
+        self.source = source
+        return first + 1, old_last - first + 1, len(rows), tokens
+
+    # the full token stream with absolute positions -- same as Lexer(source).get_tokens()
+    def get_tokens(self) -> List[Token]:
+        tokens: List[Token] = []
+        offset = 0
+        for line, (text, row) in enumerate(zip(self.source.split("\n"), self.rows), 1):
+            tokens.extend(Token(token_type, lexeme, line, offset + column) for token_type, lexeme, column in row)
+            offset += len(text) + 1 # next line starts after the newline
+        return tokens
+
+
+# lookahead buffer over a token iterator so the parsers can consume a stream like a list.
+# only the tokens between the parser's position and its furthest peek are kept in memory
+class TokenStream:
+    def __init__(self, tokens: Iterable[Token]):
+        self.source = iter(tokens)
+        self.buffer: Deque[Token] = deque() # tokens not yet released
+        self.base = 0 # absolute index of buffer[0]
+        self.last: Optional[Token] = None # last token read from the source
+
+    # read one more token into the buffer
+    def fill(self) -> bool:
+        token = next(self.source, None)
+        if token is None:
+            return False
+        self.buffer.append(token)
+        self.last = token
+        return True
+
+    # absolute index access -- [-1] drains the stream and returns the last token, like a list would
+    def __getitem__(self, index: int) -> Token:
+        if index == -1:
+            while self.fill():
+                self.buffer.popleft() # nothing can look back, so don't keep them
+                self.base += 1
+            if self.last is None:
+                raise IndexError("token stream is empty")
+            return self.last
+        pos = index - self.base
+        if pos < 0:
+            raise IndexError(f"token {index} was already released")
+        # read ahead until the requested token is buffered
+        while pos >= len(self.buffer):
+            if not self.fill():
+                raise IndexError("token stream exhausted")
+        return self.buffer[pos]
+
+    # true if the stream produced at least one token
+    def __bool__(self) -> bool:
+        return self.last is not None or self.fill()
+
+    # forget every token before index
+    def release(self, index: int) -> None:
+        while self.buffer and self.base < index:
+            self.buffer.popleft()
+            self.base += 1
@@ -0,0 +1,215 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from AST_Tree import COLUMN_BITS, PURE_KINDS, ASTNode, NodeKind, moved
+from dataflow import INT, STRING, UNKNOWN, DataflowAnalyzer, type_of
+from traversal import Evaluator, StatementRunner
+
+# rewrites a program into a smaller one with the same output and final variables, from what DataflowAnalyzer
+# knows about it:
+#   expressions with a constant value become literals, and x + 0, x - 0, x * 1, x / 1 (x an int) become x
+#   an if whose condition is always false is removed, one whose condition is always true is replaced by its body
+#   a loop that never runs is removed
+#   a store to a variable that is never read (see SemanticAnalyzer.check_unused_variables) is removed when the
+#   same list stores to it again before anything can fail
+# only code that cannot fail is removed or folded, so runtime errors stay the same, on the same lines. The tree is not
+# changed -- the result is a new tree sharing the nodes that stayed the same. self.report says what was done
+class Optimizer:
+    def __init__(self, unused: Iterable[str] = ()):
+        self.unused: Set[str] = set(unused) # names that are stored to but never read
+        self.report: List[str] = [] # what was done, by line
+        self.counts: Dict[str, int] = dict.fromkeys(("folded", "propagated", "simplified", "ifs removed", "ifs inlined",
+                                                     "loops removed", "dead stores"), 0)
+        self.dataflow: Optional[DataflowAnalyzer] = None
+        self.blocks: List[List[Tuple[int, ASTNode, bool]]] = [] # statement lists being rebuilt: (line, node, cannot fail)
+        self.result: Optional[ASTNode] = None
+        operators = {kind: self.rewrite for kind in PURE_KINDS}
+        operators.update({NodeKind.Var: self.rewrite_Var, NodeKind.Int: self.literal, NodeKind.String: self.literal})
+        self.evaluator = Evaluator(operators) # an expression rewritten bottom-up, no recursion
+        visitors = {kind: self.generic_visit for kind in NodeKind}
+        visitors.update({kind: getattr(self, f"visit_{kind}") for kind in
+                         (NodeKind.Program, NodeKind.Assign, NodeKind.Print, NodeKind.If, NodeKind.Loop)})
+        self.runner = StatementRunner(visitors)
+
+    # the optimized program
+    def optimize(self, program: ASTNode) -> ASTNode:
+        self.dataflow = DataflowAnalyzer().analyze(program)
+        self.runner.run((program,))
+        return self.result
+
+    # how many changes of each kind were made
+    def summary(self) -> str:
+        return ", ".join(f"{count} {what}" for what, count in self.counts.items() if count) or "nothing to optimize"
+
+    def note(self, line: int, message: str) -> None:
+        self.report.append(f"Line {line}: {message}")
+
+# expressions -- each operator gets the node and its children already rewritten
+    def literal(self, node: ASTNode) -> ASTNode:
+        return node
+
+    # a variable with a known value is read as that value
+    def rewrite_Var(self, node: ASTNode) -> ASTNode:
+        folded = self.folded(node)
+        if folded is not node:
+            self.counts["propagated"] += 1
+        return folded
+
+    def rewrite(self, node: ASTNode, *children: ASTNode) -> ASTNode:
+        folded = self.folded(node)
+        if folded is not node:
+            self.counts["folded"] += 1
+            return folded
+        if node.kind == NodeKind.BinOp:
+            operand = self.identity(node, *children)
+            if operand is not None:
+                self.counts["simplified"] += 1
+                return operand
+        if all(new is old for new, old in zip(children, node.children)):
+            return node
+        return ASTNode(node.kind, node.value, list(children), node.start, node.end)
+
+    # a literal for a node whose value is known -- ints and strings, booleans only occur in conditions
+    def folded(self, node: ASTNode) -> ASTNode:
+        value = self.dataflow.constant(node)
+        if value is UNKNOWN or type_of(value) not in (INT, STRING):
+            return node
+        return ASTNode(NodeKind.Int if type_of(value) == INT else NodeKind.String, value, None, node.start, node.end)
+
+    # the operand of x + 0, 0 + x, x - 0, x * 1, 1 * x or x / 1 when x is an int (on a string, + 0 fails and * 1 does
+    # not; on a boolean the result is an int)
+    def identity(self, node: ASTNode, left: ASTNode, right: ASTNode) -> Optional[ASTNode]:
+        op = node.value
+        if self.dataflow.type_of(node.children[0]) == INT:
+            if op in ('+', '-') and is_int(right, 0) or op in ('*', '/') and is_int(right, 1):
+                return left
+        if self.dataflow.type_of(node.children[1]) == INT:
+            if op == '+' and is_int(left, 0) or op == '*' and is_int(left, 1):
+                return right
+        return None
+
+    # an expression that cannot fail -- it has a known value
+    def safe(self, node: ASTNode) -> bool:
+        return self.dataflow.constant(node) is not UNKNOWN
+
+# statements -- each adds itself, rebuilt, to the list being rebuilt (self.blocks[-1]) at its absolute line
+    def generic_visit(self, node: ASTNode):
+        self.blocks[-1].append((self.runner.line, node, False))
+
+    def visit_Program(self, node: ASTNode):
+        return self.rebuilt(node, self.runner.line, node.children[:0])
+
+    def visit_Assign(self, node: ASTNode):
+        var, expression = node.children
+        new = self.evaluator.evaluate(expression)
+        if new is not expression:
+            node = ASTNode(node.kind, node.value, [var, new], node.start, node.end)
+        self.blocks[-1].append((self.runner.line, node, self.safe(expression)))
+
+    def visit_Print(self, node: ASTNode):
+        expression = node.children[0]
+        new = self.evaluator.evaluate(expression)
+        if new is not expression:
+            node = ASTNode(node.kind, node.value, [new], node.start, node.end)
+        self.blocks[-1].append((self.runner.line, node, self.safe(expression)))
+
+    # an if with a known condition is its body or nothing -- its statements join the list the if is in
+    def visit_If(self, node: ASTNode):
+        condition = self.dataflow.constant(node.children[0])
+        line = self.runner.line
+        if condition is UNKNOWN:
+            return self.rebuilt(node, line, [self.evaluator.evaluate(node.children[0])])
+        if condition:
+            self.counts["ifs inlined"] += 1
+            self.note(line, "if condition is always true, replaced by its body")
+            return (node.children[1:],)
+        self.counts["ifs removed"] += 1
+        self.note(line, "if condition is always false, removed")
+        return None
+
+    def visit_Loop(self, node: ASTNode):
+        line = self.runner.line
+        bounds = self.dataflow.bounds.get(node)
+        if bounds is not None and bounds[0] > bounds[1]:
+            self.counts["loops removed"] += 1
+            self.note(line, "loop never runs, removed")
+            return None
+        var, start, end = node.children[:3]
+        return self.rebuilt(node, line, [var, self.evaluator.evaluate(start), self.evaluator.evaluate(end)])
+
+    # node with its statement list rebuilt after the children before it (head)
+    def rebuilt(self, node: ASTNode, line: int, head: Sequence[ASTNode]):
+        self.blocks.append([])
+        yield node.children[len(head):]
+        block = self.without_dead_stores(self.blocks.pop())
+        children = list(head)
+        previous = line # statement lines count from the one before, the first from the owner
+        for statement_line, statement, _ in block:
+            children.append(moved(statement, statement_line - previous - (statement.start >> COLUMN_BITS)))
+            previous = statement_line
+        if len(children) == len(node.children) and all(new is old for new, old in zip(children, node.children)):
+            new = node
+        else:
+            new = ASTNode(node.kind, node.value, children, node.start, node.end)
+        if node.kind == NodeKind.Program:
+            self.result = new
+        else:
+            self.blocks[-1].append((line, new, False))
+
+    # a list without the stores to unused variables that are stored to again later in it. Only statements that
+    # cannot fail may come between the two stores, so the first one is never the value left by an error -- and no
+    # variable may be first assigned between them, so the variables stay in the order they were made in
+    def without_dead_stores(self, block: List[Tuple[int, ASTNode, bool]]) -> List[Tuple[int, ASTNode, bool]]:
+        unused = self.unused
+        if not unused:
+            return block
+        dead: Set[int] = set()
+        assigned: Set[str] = set() # names stored to earlier in the list -- they exist when later statements run
+        existing: Dict[str, int] = {} # unused name -> its last store so far, if the name existed before it
+        created: Dict[str, int] = {} # unused name -> its last store so far, if that may have made the name
+        for index, (line, node, safe) in enumerate(block):
+            target = node.children[0].value if node.kind == NodeKind.Assign else None
+            if not safe:
+                existing.clear()
+                created.clear()
+            elif target is not None:
+                creates = target not in assigned # this store may make the variable
+                for stores in (existing, created):
+                    store = stores.pop(target, None)
+                    if store is not None:
+                        dead.add(store)
+                        creates = creates or stores is created # it takes over from the removed store
+                if creates:
+                    created.clear() # a new variable -- the stores before it must stay before it
+                if target in unused:
+                    (created if creates else existing)[target] = index
+            if target is not None:
+                assigned.add(target)
+        if not dead:
+            return block
+        for index in sorted(dead):
+            line, node, _ = block[index]
+            self.counts["dead stores"] += 1
+            self.note(line, f"dead store to '{node.children[0].value}' removed")
+        return [entry for index, entry in enumerate(block) if index not in dead]
+
+# an Int literal with this value
+def is_int(node: ASTNode, value: int) -> bool:
+    return node.kind == NodeKind.Int and type(node.value) is int and node.value == value
+
+
+# the optimized program and what was done
+if __name__ == "__main__":
+    import sys
+    from lexer import Lexer
+    from AST_Tree import ASTParser, print_tree
+    from errors import UNUSED_VARIABLE
+    from semantics import SemanticAnalyzer
+
+    with open(sys.argv[1]) as file:
+        source = file.read()
+    tree = ASTParser(Lexer(source).get_tokens(), source).parse()
+    analyzer = SemanticAnalyzer()
+    analyzer.analyze(tree)
+    optimizer = Optimizer(diagnostic.variable for diagnostic in analyzer.diagnostics.of(UNUSED_VARIABLE))
+    print_tree(optimizer.optimize(tree), indent=0)
+    print("\n".join(optimizer.report))
+    print(optimizer.summary())
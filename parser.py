@@ -1,35 +1,116 @@
 from errors import ParserError
-from lexer import TokenType
+from grammar import LANGU
+from lexer import LineIndex, TokenType, TokenStream
 # cSpell:ignore MULT_OP
 
 
+# token groups used by the grammar rules -- read from the compiled grammar (see grammar.py)
+BLOCK_ENDS = LANGU.follow_set("statements") # END_P, END_IF, END_LOOP
+ADD_OPS = LANGU.first_set("add_op")
+MULT_OPS = LANGU.first_set("mul_op")
+REL_OPS = LANGU.first_set("rel_op")
+LOGIC_OPS = LANGU.first_set("logic_op")
+LOOP_BOUNDS = LANGU.first_set("bound")
+BLOCK_STARTS = LANGU.first_set("if_statement") | LANGU.first_set("loop_statement")
+STATEMENT_STARTS = LANGU.first_set("statement") | {TokenType.LEFT_PAREN} # '(' for the missing 'if' / 'loop' errors
 
-# parse the tokens generated by the lexer
+# the alternative the parse table picks for a token, indexed by token_type.value (-1 for none)
+STATEMENT_RULE = LANGU.predict("statement") # 0 assignment, 1 if, 2 loop, 3 print
+FACTOR_RULE = LANGU.predict("factor") # 0 '-', 1 var, 2 INT_LIT, 3 STRING_LIT, 4 '('
+BOUND_RULE = LANGU.predict("bound") # 0 INT_LIT, 1 var
+LOGIC_RULE = LANGU.predict("logic_expr") # 0 '(' <logic_expr> ')', 1 <rel_expr>
+# a recovering parser skips a broken statement up to one of these
+SYNC_TOKENS = frozenset({TokenType.SEMI, TokenType.END_IF, TokenType.END_LOOP, TokenType.END_P})
+# the "Missing 'loop'" lookahead never looks past the statement it started in
+SCAN_STOPS = SYNC_TOKENS | BLOCK_STARTS | {TokenType.RIGHT_PAREN, TokenType.PRINT, TokenType.PROGRAM}
+
+# binding powers for every binary operator: token type -> (left power, right power, AST node kind)
+# a higher power binds tighter, and left < right makes an operator left-associative
+# expr() only takes operators from ARITH_POWER up, so it stops at relational and logical operators -- those
+# rows are used by rel_expr / logic_expr, which keep the grammar's one comparison and right-fold chain rules
+BINDING_POWERS = {
+    TokenType.LOGICAL_AND: (1, 1, 'LogicOp'),
+    TokenType.LOGICAL_OR: (1, 1, 'LogicOp'),
+    **{op: (3, 4, 'RelOp') for op in REL_OPS},
+    **{op: (5, 6, 'BinOp') for op in ADD_OPS},
+    **{op: (7, 8, 'BinOp') for op in MULT_OPS},
+}
+ARITH_POWER = 5 # lowest power inside an arithmetic <expr>
+
+# a source position packed into one int: line << COLUMN_BITS | column -- a column that does not fit is stored as
+# 0 (unknown) rather than spill into the line
+COLUMN_BITS = 20
+COLUMN_MASK = (1 << COLUMN_BITS) - 1
+
+OPEN = None # a '(' still waiting for its ')' on expr()'s stack
+
+
+# an if / loop statement whose header has been parsed -- statements() parses its body and closing token next
+class OpenBlock:
+    __slots__ = ("kind", "value", "head", "closer", "start_line")
+
+    def __init__(self, kind, value, head, closer, start_line):
+        self.kind = kind # the node kind
+        self.value = value
+        self.head = head # the header's nodes, the body follows them in the node's children
+        self.closer = closer # END_IF / END_LOOP
+        self.start_line = start_line # line of the 'if' / 'loop', for errors
+
+
+# parse the tokens generated by the lexer -- one grammar engine with two modes:
+#   build=False  only validates the program, no AST nodes are allocated
+#   build=True   also builds and returns the AST (this is what ASTParser does)
+# with recover=True syntax errors are collected in self.errors instead of raised: the parser skips the broken
+# statement (panic mode) and carries on, so one pass reports every error and still returns a best-effort AST
 class Parser:
     # initializations
-    def __init__(self, tokens, source_code=None):
-        self.tokens = tokens  # list of tokens
+    def __init__(self, tokens, source_code=None, line_index=None, build=False, recover=False):
+        # list of tokens, or any iterable of tokens (e.g. Lexer.iter_tokens) wrapped in a lookahead buffer
+        self.tokens = tokens if hasattr(tokens, "__getitem__") else TokenStream(tokens)
+        self.release = getattr(self.tokens, "release", None) # drops consumed tokens from a stream
         self.index = 0 # set the current index to 0
         self.current_token = None # set current token to none
         self.source_code = source_code # get the source code
+        self.line_index = line_index # line-start index of the source (e.g. Lexer.line_index), built on first error if missing
         self.errors = []  # used to collect errors
+        self.build = build # build the AST, or only validate
+        self.recover = recover # collect syntax errors and resynchronize, or stop at the first one
+        self.depth = 0 # if / loop blocks currently open
+        self.make_node = None # AST node factory, only used when building
+        self.last = None # the last token consumed
+        self.base = 0 # line that node positions count from -- the statement being parsed
+        self.line_starts = None # start of each line, for node columns
+        self.first_line = 1 # line of line_starts[0]
+        if build:
+            from AST_Tree import ASTNode # imported here since AST_Tree imports this module
+            self.make_node = ASTNode
+            # node columns come from the line-start index
+            if self.line_index is None and source_code is not None:
+                self.line_index = LineIndex(source_code)
+            if self.line_index is not None:
+                self.line_starts, self.first_line = self.line_index.starts, self.line_index.line
         self.advance()  # used to advance the token
 
 # token management
     # advance to the next token
     def advance(self):
+        if self.current_token is not None:
+            self.last = self.current_token
+        self.current_token = self.peek() # set the current token to the next token (None if there are no more)
         # if more tokens exist
-        if self.index < len(self.tokens):
-            self.current_token = self.tokens[self.index] # set the index to the next token
+        if self.current_token is not None:
             self.index += 1 # increment
-        # else there are no more tokens
-        else:
-            self.current_token = None # set the current token to None
+            # a stream only has to keep what we may still peek at
+            if self.release is not None:
+                self.release(self.index)
 
     # check the next token -- without consuming
     def peek(self, offset=0):
-        idx = self.index + offset # calculate the index of the next token
-        return self.tokens[idx] if idx < len(self.tokens) else None # return the token if its in bounds
+        # return the token if its in bounds
+        try:
+            return self.tokens[self.index + offset]
+        except IndexError:
+            return None
 
     # token matching if it is the right token
     def match(self, expected_token):
@@ -41,243 +122,446 @@ class Parser:
             self.error(f"Expected {expected_token}") # error
 
 # error handling
-    # handle the errors
+    # handle the errors -- always raises, the statement can't go on
     def error(self, message, line_override=None, column_override=None):
-            # figure out the line
-            if line_override is not None:
-                line = line_override
-            elif self.current_token:
-                line = self.current_token.line
-            else:
-                line = "unknown"
-            # figure out the column
-            if column_override is not None:
-                column = column_override
-            elif self.current_token and hasattr(self.current_token, "column"):
-                column = self.current_token.column
-            else:
-                column = None
-            # raise the error
-            raise ParserError(message, line=line, column=column, lexeme=(self.current_token.lexeme if self.current_token else None))
+        raise self.diagnostic(message, line_override, column_override)
+
+    # report an error the parser can step over (e.g. a missing ';') -- recorded when recovering, else raised
+    def report(self, message, line_override=None):
+        diagnostic = self.diagnostic(message, line_override)
+        if not self.recover:
+            raise diagnostic
+        self.errors.append(diagnostic)
+
+    # build the ParserError for the current token
+    def diagnostic(self, message, line_override=None, column_override=None):
+        # figure out the line
+        if line_override is not None:
+            line = line_override
+        elif self.current_token:
+            line = self.current_token.line
+        else:
+            line = "unknown"
+        # figure out the column
+        if column_override is not None:
+            column = column_override
+        elif self.current_token and line_override is None:
+            column = self.column(self.current_token) # only meaningful on the token's own line
+        else:
+            column = None
+        return ParserError(message, line=line, column=column, lexeme=(self.current_token.lexeme if self.current_token else None))
+
+    # 1-based column of a token, looked up in the line-start index -- None if we have no source to index
+    def column(self, token):
+        if self.line_index is None:
+            if self.source_code is None:
+                return None
+            self.line_index = LineIndex(self.source_code) # built once, then reused
+        return self.line_index.column(token.start) + 1
+
+    # panic mode -- skip the rest of a broken statement: past its ';', or up to the end of the enclosing block.
+    # open_blocks counts the if / loop blocks the statement opened before it broke, those are skipped whole
+    def synchronize(self, open_blocks=0):
+        while self.current_token is not None:
+            token_type = self.current_token.token_type
+            # never skip the end of the program
+            if token_type == TokenType.END_P:
+                return
+            # the end of the broken statement
+            if open_blocks == 0 and token_type in SYNC_TOKENS:
+                if token_type == TokenType.SEMI:
+                    self.advance() # consume it
+                return
+            # a block inside the skipped code
+            if token_type in BLOCK_STARTS:
+                open_blocks += 1
+            # the end of a skipped block
+            elif token_type == TokenType.END_IF or token_type == TokenType.END_LOOP:
+                open_blocks -= 1
+                if open_blocks == 0:
+                    self.advance() # consume it, the broken statement ends with it
+                    # and the optional ';' after it
+                    if self.current_token and self.current_token.token_type == TokenType.SEMI:
+                        self.advance()
+                    return
+            self.advance()
+
+# node positions (see ASTNode)
+    # packed position of a token, offset characters into it -- its line counted from self.base, its column from 1
+    # (0 without a line index, or when the column is too large to pack)
+    def position(self, token, offset=0):
+        starts = self.line_starts
+        column = token.start - starts[token.line - self.first_line] + 1 + offset if starts is not None else 0
+        if column > COLUMN_MASK:
+            column = 0
+        return (token.line - self.base) << COLUMN_BITS | column
+
+    # packed end of a node that starts at start and ends with the last token consumed
+    def end(self, start):
+        last = self.last
+        end = self.position(last, len(last.lexeme)) # one past its last character
+        return end - (start >> COLUMN_BITS << COLUMN_BITS)
+
+    # packed end of a node that starts at start and ends where node last does
+    def end_of(self, start, last):
+        return last.end + ((last.start >> COLUMN_BITS) - (start >> COLUMN_BITS) << COLUMN_BITS)
+
+    # a node for one token
+    def leaf(self, kind, value, token):
+        starts = self.line_starts
+        if starts is None:
+            return self.make_node(kind, value, None, (token.line - self.base) << COLUMN_BITS)
+        column = token.start - starts[token.line - self.first_line] + 1 # position() inlined, this is the hot one
+        end = column + len(token.lexeme)
+        if end > COLUMN_MASK:
+            column = end = 0 # too large to pack
+        return self.make_node(kind, value, None, (token.line - self.base) << COLUMN_BITS | column, end)
 
 # grammar rules
     # <program> -> program <statements> end_program
     def program(self):
+        first = self.current_token
         # if the next token is PROGRAM
         if self.current_token and self.current_token.token_type == TokenType.PROGRAM:
             start_line = self.current_token.line
             self.advance() # consume it
-            self.statements() # parse statements
-            # else if the next token is END_PROGRAM
-            if self.current_token and self.current_token.token_type == TokenType.END_P:
-                self.advance() # consume it
-            else:
-                
-                # if the current token is None and there are tokens left -- when a program ends without END_PROGRAM
-                if self.current_token is None and self.tokens:
-                    last_line = self.tokens[-1].line + 1 # get the last line
-                    self.error("Expecting 'end_program'", last_line) # error
-                    
-                # else if the current token is not None -- the last token is not END_PROGRAM
-                else:
-                    self.error("Expecting 'end_program'", start_line) # get the line number
         else:
             # else if the current token is None and there are tokens left -- the program did not start with PROGRAM
-            self.error("Expecting 'program'")
+            self.report("Expecting 'program'")
+            # nothing to parse at all
+            if self.current_token is None:
+                return self.make_node('Program', 'program', []) if self.build else None
+            start_line = self.current_token.line if self.current_token else 1 # parse the statements anyway
+            self.skip_stray() # only reached when recovering
+        self.base = first.line # top-level statements count from the program's line
+        stmts = self.statements(start_line) # parse statements
+        # else if the next token is END_PROGRAM
+        if self.current_token and self.current_token.token_type == TokenType.END_P:
+            self.advance() # consume it
+        else:
+            
+            # if the current token is None and there are tokens left -- when a program ends without END_PROGRAM
+            if self.current_token is None and self.tokens:
+                last_line = self.tokens[-1].line + 1 # get the last line
+                self.report("Expecting 'end_program'", last_line) # error
+                
+            # else if the current token is not None -- the last token is not END_PROGRAM
+            else:
+                self.report("Expecting 'end_program'", start_line) # get the line number
+        self.base = 0
+        if not self.build:
+            return None
+        start = self.position(first) # the program's position is absolute
+        return self.make_node('Program', 'program', stmts, start, self.end(start)) # the program node with its statements
 
     # <statements> -> <statement> <statements> | <empty>
-    def statements(self):
-        if (self.current_token is None or 
-            self.current_token.token_type in [TokenType.END_P, TokenType.END_IF, TokenType.END_LOOP]):
-            return # empty
-        self.statement() # parse one statement
-        self.statements() # parse additional statements
+    # each statement's line counts from the one before it, the first from the statement owning the list (self.base).
+    # the bodies of if / loop statements are parsed in the same loop, with the enclosing lists on a stack, so blocks
+    # can nest as deep as memory allows.
+    # stray_line is set for the program's own list: an 'end_if' / 'end_loop' with no block to close is then reported
+    # at that line, and when recovering the list goes on after it
+    def statements(self, stray_line=None):
+        build = self.build
+        nodes = [] if build else None # statement nodes, when building
+        base = self.base
+        previous = 0 # line of the statement before, relative to base
+        frames = [] # the lists of the open blocks: (OpenBlock, nodes, base, previous, the block's first token)
+        self.open_list()
+        while True:
+            token = self.current_token
+            # the list ends at the end of the tokens, or at an END_P, END_IF, or END_LOOP
+            if token is None or token.token_type in BLOCK_ENDS:
+                # an 'end_if' / 'end_loop' with no block to close -- step over it and keep going when recovering
+                if not frames and stray_line is not None and token is not None and token.token_type != TokenType.END_P:
+                    self.report("Expecting 'end_program'", stray_line) # error
+                    self.advance() # skip it
+                    continue
+                self.close_list()
+                if not frames:
+                    return nodes
+                # the end of the innermost open block -- it is the next statement of the list around it
+                body = nodes
+                block, nodes, base, previous, first = frames.pop()
+                node = self.close_block(block, body)
+            else:
+                depth = self.depth
+                first = token
+                self.base = first.line # nodes inside the statement count from its line
+                try:
+                    node = self.statement() # parse one statement
+                except ParserError as e:
+                    self.base = base
+                    # stop at the first error, unless we are recovering
+                    if not self.recover:
+                        raise
+                    self.errors.append(e) # record it
+                    self.synchronize(self.depth - depth) # skip the broken statement, and any block it opened
+                    self.depth = depth
+                    continue
+                # an if / loop header -- its body is parsed next, counting from its line
+                if type(node) is OpenBlock:
+                    frames.append((node, nodes, base, previous, first))
+                    nodes = [] if build else None
+                    base = first.line
+                    previous = 0
+                    self.open_list()
+                    continue
+            self.base = base
+            if build:
+                start = self.position(first)
+                node.end = self.end(start)
+                node.start = start - (previous << COLUMN_BITS)
+                previous = start >> COLUMN_BITS
+                nodes.append(node) # add it to the list of nodes
+            self.close_statement(node, first)
+
+    # the end_if / end_loop of a block whose body has been parsed, and the if / loop node
+    def close_block(self, block, body):
+        # when we find the END_IF / END_LOOP
+        if self.current_token and self.current_token.token_type == block.closer:
+            self.advance() # consume it
+        else:
+            self.report(f"Expecting 'end_{block.value}'", block.start_line) # error
+        self.depth -= 1
+        # an optional semi after it
+        if self.current_token and self.current_token.token_type == TokenType.SEMI:
+            self.advance() # advance
+        return self.make_node(block.kind, block.value, block.head + body) if self.build else None
+
+    # hooks for parsers that record where statement lists and statements are (see SpanParser):
+    # a list starts after the last token consumed, and ends at the current token
+    def open_list(self):
+        pass
+
+    def close_list(self):
+        pass
+
+    # a statement, from first to the last token consumed, was added to its list
+    def close_statement(self, node, first):
+        pass
 
     # <statement> -> <assignment> | <if_statement> | <loop_statement> | <print_statement>
     def statement(self):
+        rule = STATEMENT_RULE[self.current_token.token_type.value] if self.current_token else -1
         # if the statement is a print statement
-        if self.current_token and self.current_token.token_type == TokenType.PRINT:
+        if rule == 3:
             start_line = self.current_token.line
-            self.print_statement() # handle print
+            node = self.print_statement() # handle print
             # if its a semi
             if self.current_token and self.current_token.token_type == TokenType.SEMI:
                 self.advance() # advance
             # else missing semi
             else:
-                self.error("Expecting semicolon ';'", start_line) # error
-            return
+                self.report("Expecting semicolon ';'", start_line) # error
+                self.skip_stray() # only reached when recovering
+            return node
 
         # if we encounter a LEFT_PAREN, use our peek method
         if self.current_token and self.current_token.token_type == TokenType.LEFT_PAREN:
             next_tok = self.peek(1)
             # if we encounter a comparison operator directly after LEFT_PAREN
-            if next_tok and next_tok.token_type in {
-                TokenType.EQUALS, TokenType.NOT_EQUALS,
-                TokenType.GREATER_THAN, TokenType.LESS_THAN,
-                TokenType.GREATER_EQ, TokenType.LESS_EQ
-            }:
+            if next_tok and next_tok.token_type in REL_OPS:
                 self.error("Missing 'if' before '('") # report importer IF
                 
             # this will check for malformed loops -- find the ASSIGN_OP
             if self.peek(1) and self.peek(1).token_type == TokenType.ASSIGN_OP:
                 i = 2
-                # find the COLON
-                while (tok := self.peek(i)) and tok.token_type != TokenType.RIGHT_PAREN:
+                # find the COLON -- within this statement only, so the scan stays linear over the program
+                while (tok := self.peek(i)) and tok.token_type not in SCAN_STOPS:
                     if tok.token_type == TokenType.COLON:
                         self.error("Missing 'loop' before '('") # error
                     i += 1
-        # proper if statement?
-        if self.current_token and self.current_token.token_type == TokenType.IF_STMT:
-            self.if_statement() # parse it
-            # if we encounter a semi
-            if self.current_token and self.current_token.token_type == TokenType.SEMI:
-                self.advance() # advance
-        # proper loop statement?
-        elif self.current_token and self.current_token.token_type == TokenType.LOOP:
-            self.loop_statement() # parse it
-            # if we encounter semi
-            if self.current_token and self.current_token.token_type == TokenType.SEMI:
-                self.advance() # advance
+        # proper if statement? -- its body, end_if and optional ';' are parsed by statements()
+        if rule == 1:
+            node = self.if_statement() # parse its header
+        # proper loop statement? -- the same for its body and end_loop
+        elif rule == 2:
+            node = self.loop_statement() # parse its header
         else:
             start_line = self.current_token.line if self.current_token else None # save line number
-            self.assignment() # parse the assignment
+            node = self.assignment() # parse the assignment
             # if we have a semi next
             if self.current_token and self.current_token.token_type == TokenType.SEMI:
                 self.advance() # advance
             # else -- we're missing a semi
-            elif self.current_token and self.current_token.token_type in [TokenType.IDENT, TokenType.INT_LIT]:
-                self.error("Expecting semicolon ';'", start_line + 1) # error
+            elif self.current_token and self.current_token.token_type in LOOP_BOUNDS:
+                self.report("Expecting semicolon ';'", start_line + 1) # error
             else:
                 # we're missing a semi and hitting other tokens
                 if start_line is not None:
-                    self.error("Expecting semicolon ';'", start_line + 1) # error with line number
+                    self.report("Expecting semicolon ';'", start_line + 1) # error with line number
                 else:
-                    self.error("Expecting semicolon ';'") # error without line number
+                    self.report("Expecting semicolon ';'") # error without line number
+                self.skip_stray() # only reached when recovering
+        return node
+
+    # after a missing ';' -- skip what can't start the next statement, so one mistake is one error
+    def skip_stray(self):
+        if self.current_token and self.current_token.token_type not in STATEMENT_STARTS:
+            self.synchronize()
 
     # <assignment> -> <var> = <expr>
     def assignment(self):
-        self.var() # parse the var
+        var = self.var() # parse the var
         # if the next token is ASSIGN_OP
         if self.current_token and self.current_token.token_type == TokenType.ASSIGN_OP:
             self.advance() # consume it
-            self.expr() # parse the expression
+            expr_node = self.expr() # parse the expression
         else:
             # else... missing ASSIGN_OP
             self.error("Expecting assignment operator '='") # error
+        return self.make_node('Assign', '=', [var, expr_node]) if self.build else None # the var and expression
 
     # <var> -> IDENT
     def var(self):
         # if the current token is an IDENT
         if self.current_token and self.current_token.token_type == TokenType.IDENT:
+            node = self.leaf('Var', self.current_token.lexeme, self.current_token) if self.build else None
             self.advance()  # consume it
+            return node
         else:
             # else we're missing an IDENT
             self.error("Expecting identifier") # error
 
-    # <expr> -> <term> {(+|-) <term>}
+    # <expr> -> <term> {(+|-) <term>}, <term> -> <factor> {(*|/|%) <factor>}
+    # <factor> -> - <factor> | <var> | INT_LIT | STRING_LIT | ( <expr> )
+    # operator precedence over BINDING_POWERS, with what is still open left of the current operand on a stack:
+    # a '(' (OPEN), a run of unary minus signs (a list of their tokens) or a binary operator (its token). So
+    # parentheses and signs nest as deep as memory allows
     def expr(self):
-        self.term() # parse one term
-        # if we have "+" or "-" next
-        while self.current_token and self.current_token.token_type in [TokenType.ADD_OP, TokenType.SUB_OP]:
-            self.advance() # consume it
-            self.term() # parse the next term
+        build = self.build
+        pending = [] # the stack
+        operands = [] # the left operand of each operator on it, when building
+        while True:
+            token = self.current_token
+            rule = FACTOR_RULE[token.token_type.value] if token else -1
+            # if the token is a IDENTIFIER or INT_LIT -- the common case, checked first
+            if rule == 1 or rule == 2:
+                node = None
+                if build:
+                    # integer literals are decoded here, once
+                    node = self.leaf('Var', token.lexeme, token) if rule == 1 else self.leaf('Int', int(token.lexeme), token)
+                self.advance() # consume it
+            # else if the token is a STRING
+            elif rule == 3:
+                node = self.leaf('String', token.lexeme[1:-1], token) if build else None # without quotes
+                self.advance()  # consume it
+            # else if the token is LEFT_PAREN -- open it, its expression comes next
+            elif rule == 4:
+                pending.append(OPEN)
+                self.advance() # consume it
+                continue
+            # else if the token is a unary minus -- keep the run of them, they wrap the operand that follows
+            elif rule == 0:
+                signs = [] # the sign tokens
+                while self.current_token and self.current_token.token_type == TokenType.SUB_OP:
+                    signs.append(self.current_token)
+                    self.advance() # consume it
+                pending.append(signs)
+                continue
+            # else we have improper parameters
+            else:
+                self.error("Expecting variable, integer literal, string literal, or expression") # error
 
-    # <term> -> <factor> {(*|/|%) <factor>}
-    def term(self):
-        self.factor() # parse one factor
-        # if we have "*", "/", or "%" next
-        while self.current_token and self.current_token.token_type in [TokenType.MULT_OP, TokenType.DIV_OP, TokenType.MOD_OP]:
-            self.advance()  # consume it
-            self.factor() # parse the next factor
+            # the operand is done -- close what it completes, up to the next binary operator
+            while True:
+                # the signs right before it
+                if pending and type(pending[-1]) is list:
+                    signs = pending.pop()
+                    if build:
+                        for sign in reversed(signs):
+                            start = self.position(sign)
+                            node = self.make_node('UnaryOp', '-', [node], start, self.end_of(start, node))
+                    continue
+                op = self.current_token # the operator
+                power = BINDING_POWERS.get(op.token_type) if op else None
+                if power is not None and power[0] < ARITH_POWER:
+                    power = None # a relational or logical operator ends the expression
+                # the operators on the stack that bind tighter than it take the operand, the others stay open
+                while pending and pending[-1] is not OPEN and (power is None or BINDING_POWERS[pending[-1].token_type][1] > power[0]):
+                    left_op = pending.pop()
+                    if build:
+                        left = operands.pop()
+                        node = self.make_node(BINDING_POWERS[left_op.token_type][2], left_op.lexeme, [left, node], left.start, self.end_of(left.start, node))
+                if power is not None:
+                    pending.append(op)
+                    if build:
+                        operands.append(node)
+                    self.advance() # consume it, its right operand comes next
+                    break
+                if not pending:
+                    return node
+                pending.pop() # the '(' the operand is in
+                # If we encounter the RIGHT_PAREN
+                if self.current_token and self.current_token.token_type == TokenType.RIGHT_PAREN:
+                    self.advance() # consume it
+                # else we are missing the RIGHT_PAREN
+                else:
+                    self.error("Expecting right parenthesis ')'") # error
 
+    # <bound> -> INT_LIT | <var> -- the bounds of a loop
     def var_or_literal(self):
+        rule = BOUND_RULE[self.current_token.token_type.value] if self.current_token else -1
         # if the current token is an IDENT or INT_LIT
-        if self.current_token and self.current_token.token_type in (TokenType.IDENT, TokenType.INT_LIT):
+        if rule >= 0:
+            node = None
+            if self.build:
+                token = self.current_token
+                node = self.leaf('Int', int(token.lexeme), token) if rule == 0 else self.leaf('Var', token.lexeme, token)
             self.advance() # consume it
+            return node
         else:
             # else...
             self.error("Expecting identifier or integer literal") # error
 
-    # <factor> -> <var> | INT_LIT | STRING_LIT | ( <expr> )
-    def factor(self):
-        # if the token is a IDENTIFIER
-        if self.current_token and self.current_token.token_type == TokenType.IDENT:
-            self.var() # parse it as a variable
-        # else if the token is INT_LIT
-        elif self.current_token and self.current_token.token_type == TokenType.INT_LIT:
-            self.advance()  # consume it
-        # else if the token is a STRING
-        elif self.current_token and self.current_token.token_type == TokenType.STRING_LIT:
-            self.advance()  # consume it
-        # else if the token is LEFT_PAREN
-        elif self.current_token and self.current_token.token_type == TokenType.LEFT_PAREN:
-            self.advance() # consume it
-            self.expr() # parse the expression
-            # If we encounter the RIGHT_PAREN
-            if self.current_token and self.current_token.token_type == TokenType.RIGHT_PAREN:
-                self.advance() # consume it
-                
-            # else we are missing the RIGHT_PAREN
-            else:
-                self.error("Expecting right parenthesis ')'") # error
-        # else we have improper parameters
-        else:
-            self.error("Expecting variable, integer literal, string literal, or expression") # error
-
     # <print_statement> -> PRINT ( <expr> )
     def print_statement(self):
         self.match(TokenType.PRINT) # parse the PRINT function
         self.match(TokenType.LEFT_PAREN) # parse the left paren
-        self.expr() # parse the expression
+        expr_node = self.expr() # parse the expression
         self.match(TokenType.RIGHT_PAREN) # parse the right paren
+        return self.make_node('Print', 'print', [expr_node]) if self.build else None # the print node & expression
 
     # <if_statement> -> if ( <logic_expr> ) <statements> end_if
+    # parses the header, statements() goes on with the body
     def if_statement(self):
         start_line = self.current_token.line if self.current_token else None # get the line number
         self.match(TokenType.IF_STMT) # consume the "IF"
+        self.depth += 1 # the block is open until its end_if
         # when we find the LEFT_PAREN
         if self.current_token and self.current_token.token_type == TokenType.LEFT_PAREN:
             self.advance()  # consume it
-            self.logic_expr() # parse the logical expression
+            cond = self.logic_expr() # parse the logical expression
             # when we find the RIGHT_PAREN
             if self.current_token and self.current_token.token_type == TokenType.RIGHT_PAREN:
                 self.advance() # consume it
-                self.statements() # parse statements
-                # when we find the END_IF
-                if self.current_token and self.current_token.token_type == TokenType.END_IF:
-                    self.advance()  #consume it
-                else:
-                    self.error("Expecting 'end_if'", start_line) # error
             else:
                 self.error("Expecting right parenthesis ')'", start_line) # error
         else:
             self.error("Expecting left parenthesis '('", start_line) # error
+        return OpenBlock('If', 'if', [cond] if self.build else None, TokenType.END_IF, start_line)
 
     # <loop_statement> -> loop ( <var> = <expr> : <expr> ) <statements> end_loop
+    # parses the header, statements() goes on with the body
     def loop_statement(self):
         start_line = self.current_token.line if self.current_token else None # get the line number
         self.match(TokenType.LOOP)  # consume the "LOOP"
+        self.depth += 1 # the block is open until its end_loop
         # when we find LEFT_PAREN
         if self.current_token and self.current_token.token_type == TokenType.LEFT_PAREN:
             self.advance()  # consume it
-            self.var() # parse the var
+            var = self.var() # parse the var
             # when we find the ASSIGN_OP
             if self.current_token and self.current_token.token_type == TokenType.ASSIGN_OP:
                 self.advance() # consume it
-                self.var_or_literal() # parse the var/literal
+                start = self.var_or_literal() # parse the var/literal
                 # when we find the COLON
                 if self.current_token and self.current_token.token_type == TokenType.COLON:
                     self.advance()  # consume it
-                    self.var_or_literal() # parse the var/literal
+                    end = self.var_or_literal() # parse the var/literal
                     # when we encounter the RIGHT_PAREN
                     if self.current_token and self.current_token.token_type == TokenType.RIGHT_PAREN:
                         self.advance()  # consume it
-                        self.statements() # parse statements
-                        # when we encounter the END_LOOP
-                        if self.current_token and self.current_token.token_type == TokenType.END_LOOP:
-                            self.advance()  #consume it
-                        else:
-                            self.error("Expecting 'end_loop'", start_line) # error
                     else:
                         self.error("Expecting right parenthesis ')'", start_line) # error
                 else:
@@ -286,47 +570,80 @@ class Parser:
                 self.error("Expecting assignment operator '='", start_line) # error
         else:
             self.error("Expecting left parenthesis '('", start_line) # error
+        return OpenBlock('Loop', 'loop', [var, start, end] if self.build else None, TokenType.END_LOOP, start_line)
 
-    # <logic_expr> → <rel_expr> {(&& | ||) <rel_expr>} | ( <logic_expr> )
+    # <logic_expr> → <rel_expr> {(&& | ||) <rel_expr>} | ( <logic_expr> ) {(&& | ||) <logic_expr>}
+    # chains are right-associative: a && b || c is a && (b || c)
+    # a chain is read in a loop and folded at its end, and the chains a '(' interrupted wait on a stack,
+    # so parentheses nest as deep as memory allows
     def logic_expr(self):
-        # when we encounter LEFT_PAREN
-        if self.current_token and self.current_token.token_type == TokenType.LEFT_PAREN:
-            self.advance()  # consume it
-            self.logic_expr() # parse logical expression
-            # when we encounter the RIGHT_PAREN
-            if self.current_token and self.current_token.token_type == TokenType.RIGHT_PAREN:
-                self.advance()  # consume it
-            else:
-                self.error("Expecting right parenthesis ')'") # error
-            # when we encounter "&&" / "||"
-            while self.current_token and self.current_token.token_type in [TokenType.LOGICAL_AND, TokenType.LOGICAL_OR]:
-                self.advance()  # consume them
-                self.logic_expr() # parse logical expression
-        else:
-            self.rel_expr() # parse the relative expression
-            # when we encounter "&&" / "||"
-            while self.current_token and self.current_token.token_type in [TokenType.LOGICAL_AND, TokenType.LOGICAL_OR]:
+        operands = [] if self.build else None # operand nodes, when building
+        ops = [] if self.build else None # operators between them
+        groups = [] # the chains around the open parentheses: (operands, ops)
+        grouped = True # a '(' opens a nested logical expression until the first plain <rel_expr>
+        while True:
+            # when we encounter LEFT_PAREN -- a nested chain, this one goes on after it
+            if grouped and self.current_token and LOGIC_RULE[self.current_token.token_type.value] == 0:
                 self.advance()  # consume it
-                self.rel_expr() # parse the relative expression
+                groups.append((operands, ops))
+                operands = [] if self.build else None
+                ops = [] if self.build else None
+                continue
+            grouped = False # the rest of the chain is plain relational expressions
+            node = self.rel_expr() # parse the relative expression
+            while True:
+                if self.build:
+                    operands.append(node)
+                # when we encounter "&&" / "||"
+                if self.current_token and self.current_token.token_type in LOGIC_OPS:
+                    if self.build:
+                        ops.append(self.current_token) # the operator
+                    self.advance()  # consume it
+                    break
+                node = self.fold(operands, ops) # the chain is done
+                if not groups:
+                    return node
+                # when we encounter the RIGHT_PAREN
+                if self.current_token and self.current_token.token_type == TokenType.RIGHT_PAREN:
+                    self.advance()  # consume it
+                else:
+                    self.error("Expecting right parenthesis ')'") # error
+                operands, ops = groups.pop() # the nested chain is an operand of the one around it
+                grouped = True # which is still in its parenthesized part
+
+    # a logical chain folded from the right
+    def fold(self, operands, ops):
+        if not self.build:
+            return None
+        node = operands.pop()
+        while ops:
+            op = ops.pop()
+            left = operands.pop()
+            node = self.make_node(BINDING_POWERS[op.token_type][2], op.lexeme, [left, node], left.start, self.end_of(left.start, node))
+        return node
 
     # <rel_expr> -> <expr> <rel_op> <expr>
     def rel_expr(self):
-        self.expr() # parse the expression
+        left = self.expr() # parse the expression
+        op = self.current_token # the operator
         self.rel_op() # parse the operator
-        self.expr() # parse the other expression
+        right = self.expr() # parse the other expression
+        if not self.build:
+            return None
+        return self.make_node(BINDING_POWERS[op.token_type][2], op.lexeme, [left, right], left.start, self.end_of(left.start, right))
 
     # <rel_op> -> == | != | > | < | >= | <=
     def rel_op(self):
         # if the current token is a REL_OP
-        if self.current_token and self.current_token.token_type in [
-            TokenType.EQUALS, TokenType.NOT_EQUALS,
-            TokenType.GREATER_THAN, TokenType.LESS_THAN,
-            TokenType.GREATER_EQ, TokenType.LESS_EQ
-        ]:
+        if self.current_token and self.current_token.token_type in REL_OPS:
             self.advance()  # consume it
         else:
             self.error("Expecting relational operator (==, !=, >, <, >=, <=)") # error
 
+    # parse the program -- the AST when building, else a success message
+    # when recovering the errors are in self.errors, and the AST leaves out the statements that were skipped
     def parse(self):
-        self.program()
-        return "Parsing completed successfully"
+        tree = self.program()
+        if self.build:
+            return tree
+        return f"Parsing found {len(self.errors)} error(s)" if self.errors else "Parsing completed successfully"
@@ -1,36 +1,155 @@
-from errors import SemanticError
-from AST_Tree import ASTNode
+from itertools import accumulate, islice
+from errors import UNUSED_LOOP_VARIABLE, UNUSED_VARIABLE, USED_BEFORE_ASSIGNMENT, Diagnostic, Diagnostics, SemanticError
+from AST_Tree import COLUMN_BITS, PURE_KINDS, ASTNode, NodeKind, unpack
+from traversal import Evaluator, StatementRunner
+
+# what the analyzer knows about one variable
+class Symbol:
+    __slots__ = ("type", "assignment_count", "usage_count", "position")
+
+    def __init__(self, type: str, assignment_count: int, usage_count: int, position):
+        self.type = type
+        self.assignment_count = assignment_count
+        self.usage_count = usage_count
+        self.position = position # (line, column) where it was first assigned or used
+
+    def __repr__(self) -> str:
+        return (f"Symbol(type={self.type!r}, assignment_count={self.assignment_count}, "
+                f"usage_count={self.usage_count}, position={self.position})")
+
+
+# variable name -> Symbol, with nested scopes. Names defined inside a scope are dropped when it is left; the records
+# of names from outer scopes are shared, so counts updated inside a scope stay. Every name defined while a scope is
+# open goes on an undo log -- entering is O(1), leaving is O(names defined in the scope)
+class SymbolTable:
+    def __init__(self):
+        self.symbols = {} # name -> Symbol, in the order the names were defined
+        self.defined = [] # undo log: names defined inside open scopes, innermost last
+        self.scopes = [] # where each open scope starts on the undo log
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.symbols
+
+    def __getitem__(self, name: str) -> Symbol:
+        return self.symbols[name]
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def get(self, name: str, default=None):
+        return self.symbols.get(name, default)
+
+    def keys(self):
+        return self.symbols.keys()
+
+    def items(self):
+        return self.symbols.items()
+
+    # add a name that is not in the table
+    def define(self, name: str, symbol: Symbol) -> None:
+        self.symbols[name] = symbol
+        if self.scopes:
+            self.defined.append(name)
+
+    def enter(self) -> None:
+        self.scopes.append(len(self.defined))
+
+    # leave the innermost scope -- the names defined in it are gone
+    def leave(self) -> None:
+        start = self.scopes.pop()
+        symbols = self.symbols
+        for name in self.defined[start:]:
+            del symbols[name]
+        del self.defined[start:]
+
+CHUNK = 32 # program statements per chunk, on average -- see IncrementalAnalyzer
+
+# a SymbolTable that logs every lookup while recording -- (name, symbol or None, its assignment and usage counts
+# then) -- so IncrementalAnalyzer can tell what a statement read and what it changed
+class LoggingSymbolTable(SymbolTable):
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+        self.recording = 0 # statements being summarized
+
+    def get(self, name: str, default=None):
+        symbol = self.symbols.get(name, default)
+        if self.recording:
+            if symbol is None:
+                self.lookups.append((name, None, 0, 0))
+            else:
+                self.lookups.append((name, symbol, symbol.assignment_count, symbol.usage_count))
+        return symbol
+
+# what analyzing one statement did, for the input it had -- the statement's children (nodes IncrementalParser
+# shares between parses, moved statements included), the input (name, (type, unused so far) or None if undefined)
+# of every name it looked up, and the changes: (name, assignments, usages) added to names defined before it,
+# (name, type, assignments, usages, position) of the names it defined, (code, variable, line, column) of its
+# warnings. Lines are relative to the statement's
+class Summary:
+    __slots__ = ("children", "inputs", "counts", "defined", "warnings")
+
+    def __init__(self, children, inputs, counts, defined, warnings):
+        self.children = children
+        self.inputs = inputs
+        self.counts = counts
+        self.defined = defined
+        self.warnings = warnings
 
 # checks for semantic errors such as type mismatches, variable usage before assignment, etc...
 class SemanticAnalyzer:
     def __init__(self):
-        # each variable maps to a dictionary with its type, assignment count, and usage count
-        self.symbol_table = {} # dictionary
-        self.warnings = [] # warnings
+        # each variable maps to a Symbol with its type, assignment count, and usage count
+        self.symbol_table = SymbolTable()
+        self.diagnostics = Diagnostics() # warnings, as records -- formatted when shown
+        self.visitors = {kind: getattr(self, f"visit_{kind}", self.generic_visit) for kind in NodeKind} # looked up once per kind
+        # expression types are computed on a value stack, statements run from a stack of statement lists -- no recursion
+        self.evaluator = Evaluator({kind: self.visitors[kind] for kind in PURE_KINDS}) # generic_visit types children too
+        self.runner = StatementRunner(self.visitors)
 
     # analyze the AST tree
     def analyze(self, node: ASTNode) -> None:
         self.visit(node) # start the from the root
         self.check_unused_variables() # check for unused variables after analysis
 
-    # method to select the appropriate visitor based on the node type
+    # the type of an expression, or check a statement (a program, usually)
     def visit(self, node: ASTNode):
-        method = getattr(self, f"visit_{node.kind}", self.generic_visit) # get the method name or use the generic_visit
-        return method(node) # return it.
+        if node.kind in PURE_KINDS:
+            return self.evaluator.evaluate(node)
+        self.runner.run((node,))
+
+    # (line, column) of a node inside the statement being analyzed
+    def position(self, node: ASTNode):
+        line, column = unpack(node.start)
+        return self.runner.line + line, column
 
-    # generic visit -- to handle nodes that don't have a specific visitor method
-    def generic_visit(self, node: ASTNode):
-        for child in getattr(node, "children", []):
-            self.visit(child) # visit each child
-            
+    # a SemanticError at node
+    def error(self, message: str, node: ASTNode) -> SemanticError:
+        return SemanticError(message, *self.position(node))
+
+    # a warning about a variable
+    def warn(self, code: str, variable: str, position) -> None:
+        self.diagnostics.add(Diagnostic(code, variable, *position))
+
+    # the warnings as text
+    @property
+    def warnings(self):
+        return [str(diagnostic) for diagnostic in self.diagnostics]
+
+    # generic visit -- to handle nodes that don't have a specific visitor method (their children are checked first)
+    def generic_visit(self, node: ASTNode, *child_types):
+        return None
 
 # visitor methods
-    # methods for each type of AST node
+    # methods for each type of AST node -- statements return the statement lists inside them,
+    # expressions get the types of their children
     
-    # visit for the root (PROGRAM) node
+    # visit for the root (PROGRAM) node -- its statements
     def visit_Program(self, node: ASTNode):
-        for child in node.children:
-            self.visit(child) # visit each child node.
+        return (node.children,)
 
     # visit for assignment nodes
     def visit_Assign(self, node: ASTNode):
@@ -38,35 +157,34 @@ class SemanticAnalyzer:
         var_name = var_node.value # get the variable name from the node at index 0
         expr_type = self.visit(node.children[1]) # visit the expression node to get its type
         
+        symbol = self.symbol_table.get(var_name)
         # if the variable is already declared, increment its assignment count
-        if var_name in self.symbol_table:
-            self.symbol_table[var_name]['assignment_count'] += 1
+        if symbol is not None:
+            symbol.assignment_count += 1
         # else if the variable is not declared, add it to the symbol table with its type and assignment count
         else:
-            self.symbol_table[var_name] = {
-                'type': expr_type,
-                'assignment_count': 1,
-                'usage_count': 0
-            }
-        return expr_type # return the type of the expression
+            self.symbol_table.define(var_name, Symbol(expr_type, 1, 0, self.position(var_node))) # where it was first assigned
+
+    # visit print statements -- check the printed expression
+    def visit_Print(self, node: ASTNode):
+        self.visit(node.children[0])
 
     # visit variable nodes -- check if they are used before assignment
     def visit_Var(self, node: ASTNode):
         var_name = node.value # get the variable name from the node
         
+        symbol = self.symbol_table.get(var_name)
         # if the variable is not declared, we need to add a warning
-        if var_name not in self.symbol_table:
-            self.warnings.append(f"Warning: Variable '{var_name}' used before assignment.")
+        if symbol is None:
+            position = self.position(node)
+            self.warn(USED_BEFORE_ASSIGNMENT, var_name, position)
             # update the symbol table
-            self.symbol_table[var_name] = {
-                'type': 'int',
-                'assignment_count': 0,
-                'usage_count': 1
-            }
+            symbol = Symbol('int', 0, 1, position)
+            self.symbol_table.define(var_name, symbol)
         # else if the variable is declared already, simply increment the count
         else:
-            self.symbol_table[var_name]['usage_count'] += 1 # increment the usage count of the variable
-        return self.symbol_table[var_name]['type'] # return the type of the variable
+            symbol.usage_count += 1 # increment the usage count of the variable
+        return symbol.type # return the type of the variable
 
     # visit string nodes and return the type as string
     def visit_String(self, node: ASTNode):
@@ -77,40 +195,31 @@ class SemanticAnalyzer:
         return 'int'
 
     # visit binary operations -- check the types of the operands and make sure they are valid (ie: not int or div by 0)
-    def visit_BinOp(self, node: ASTNode):
-        left_type = self.visit(node.children[0]) # visit the left operand to get its type
-        right_type = self.visit(node.children[1]) # visit the right operand to get its type
-        
+    def visit_BinOp(self, node: ASTNode, left_type, right_type):
         # if the left or right operand is not an int
         if left_type != 'int' or right_type != 'int':
-            raise SemanticError("Non-integer operands used with arithmetic operator.") # error
+            raise self.error("Non-integer operands used with arithmetic operator.", node) # error
         # if we detect division by 0
-        if node.value == '/' and node.children[1].kind == 'Int' and int(node.children[1].value) == 0:
-            raise SemanticError("Division by zero detected.") # error
+        if node.value == '/' and node.children[1].kind == NodeKind.Int and node.children[1].value == 0:
+            raise self.error("Division by zero detected.", node) # error
         
         return 'int' # return int since it's a binary operation
     
     # visit unary operations -- check the types of the operands are both bool
-    def visit_LogicOp(self, node: ASTNode):
-        left_type = self.visit(node.children[0])
-        right_type = self.visit(node.children[1])
-        
+    def visit_LogicOp(self, node: ASTNode, left_type, right_type):
         # if either operator is not bool
         if left_type != 'bool' or right_type != 'bool':
-            raise SemanticError("Logical operators require boolean operands.") # error
+            raise self.error("Logical operators require boolean operands.", node) # error
         return 'bool' # return bool
     
     #  NOTE: although this language does not directly use boolean operators, they are still used in and 
     # produced as a by-product of logical and relational operations / if statements.
 
     # visit relational operation --- check the types of the operands and ensures they are the same
-    def visit_RelOp(self, node: ASTNode):
-        left_type = self.visit(node.children[0])
-        right_type = self.visit(node.children[1])
-        
+    def visit_RelOp(self, node: ASTNode, left_type, right_type):
         # if the type are not the same
         if left_type != right_type:
-            raise Exception("Semantic Error: Mismatched types in relational operator.") # error
+            raise self.error("Mismatched types in relational operator.", node) # error
         return 'bool'
 
     # visit method for if statements, it checks the type of the condition and ensures it is boolean.
@@ -118,9 +227,8 @@ class SemanticAnalyzer:
         condition_type = self.visit(node.children[0]) # visit the condition to get its type.
         # if the condition of the if() is not boolean, raise an error.
         if condition_type != 'bool':
-           raise SemanticError("Condition in IF statement must be boolean.")
-        for stmt in node.children[1:]:
-            self.visit(stmt) # visit each statement in the body of the if().
+           raise self.error("Condition in IF statement must be boolean.", node.children[0])
+        return (node.children[1:],) # visit each statement in the body of the if().
 
     # visit loop --- check loop bound types and make sure they are ints
     def visit_Loop(self, node: ASTNode):
@@ -130,31 +238,200 @@ class SemanticAnalyzer:
         
         # if either is not an int
         if start_type != 'int' or end_type != 'int':
-            raise SemanticError("Loop bounds must be integers.") # error
-        
-        old_table = self.symbol_table.copy() # create a copy of the current symbol table
+            raise self.error("Loop bounds must be integers.", node.children[1] if start_type != 'int' else node.children[2]) # error
         
+        return self.loop_scope(node)
+
+    # the loop body, with the loop variable in scope until it is done
+    def loop_scope(self, node: ASTNode):
+        loop_var = node.children[0].value
+        position = self.position(node.children[0])
+        self.symbol_table.enter() # variables first defined in the loop are scoped to it
+        symbol = self.symbol_table.get(loop_var)
         # if the loop variable is already declared, increment its count for stats
-        if loop_var in self.symbol_table:
-            self.symbol_table[loop_var]['assignment_count'] += 1
+        if symbol is not None:
+            symbol.assignment_count += 1
         # else if its is not declared, add it to the table with its type and count
         else:
-            self.symbol_table[loop_var] = {
-                'type': 'int',
-                'assignment_count': 1,
-                'usage_count': 0
-            }
-        # visit the loop body --- each statement
-        for stmt in node.children[3:]:
-            self.visit(stmt)
+            symbol = Symbol('int', 1, 0, position)
+            self.symbol_table.define(loop_var, symbol)
+        yield node.children[3:] # visit the loop body --- each statement
         # if the loop variable is not used (we check the table)
-        if self.symbol_table[loop_var]['usage_count'] == 0:
-            self.warnings.append(f"Warning: Loop variable '{loop_var}' declared but never used.") # warning
-        self.symbol_table = old_table # restore original symbol table -- loop variable is no longer in scope
+        if symbol.usage_count == 0:
+            self.warn(UNUSED_LOOP_VARIABLE, loop_var, position) # warning
+        self.symbol_table.leave() # loop variable is no longer in scope
 
     # check for unused variables after the analysis
     def check_unused_variables(self):
         # for each variable that is assigned and never used
-        for var, meta in self.symbol_table.items():
-            if meta['assignment_count'] > 0 and meta['usage_count'] == 0:
-                self.warnings.append(f"Warning: Variable '{var}' assigned but never used.") # warning
+        for var, symbol in self.symbol_table.items():
+            if symbol.assignment_count > 0 and symbol.usage_count == 0:
+                self.warn(UNUSED_VARIABLE, var, symbol.position) # warning
+
+
+# a SemanticAnalyzer for analyzing the same program again after edits -- it keeps a Summary of every statement it
+# analyzed, and a statement that comes again (the same children) with the same input is not analyzed: its summary is
+# replayed, with its lines moved to where the statement is now. An if or loop that is replayed skips its whole body.
+# The program's statements are also summarized in chunks, so a long run of statements an edit did not touch is
+# replayed at once. The symbol table and warnings are the same a new SemanticAnalyzer gives. Summaries of statements
+# no longer in the program are dropped once as many new ones have been made as were kept
+class IncrementalAnalyzer(SemanticAnalyzer):
+    def __init__(self):
+        super().__init__()
+        self.summaries = {} # id(statement.children) -> Summary
+        self.chunks = {} # (ids of the statements' children, their starts) -> Summary, for the last program
+        self.serials = {} # id(statement.children) -> (children, serial), for the last program's statements
+        self.serial = 0 # the next serial -- the program's statements are numbered in the order they are first seen
+        self.kept = self.created = 0 # summaries kept by the last sweep, and made since
+        self.reused = self.analyzed = 0 # statements replayed / analyzed by the last analyze()
+        visitors = dict(self.visitors)
+        for kind in (NodeKind.Assign, NodeKind.Print, NodeKind.If, NodeKind.Loop):
+            visitors[kind] = self.summarized(self.visitors[kind])
+        self.runner = StatementRunner(visitors)
+
+    # analyze the AST tree -- a fresh symbol table and warnings each time
+    def analyze(self, node: ASTNode) -> None:
+        self.symbol_table = LoggingSymbolTable()
+        self.diagnostics = Diagnostics()
+        self.reused = self.analyzed = 0
+        if node.kind == NodeKind.Program:
+            self.analyze_chunks(node)
+            self.check_unused_variables()
+        else:
+            super().analyze(node)
+        if self.created > self.kept:
+            self.sweep(node)
+
+    # the program's statements, a chunk at a time. A chunk ends after a statement whose serial is the last of a run of
+    # CHUNK. A statement keeps its serial while its children do, so an edit changes only the chunks around it and the
+    # others keep their summaries -- and the same edits always give the same chunks
+    def analyze_chunks(self, program: ASTNode) -> None:
+        chunks, self.chunks = self.chunks, {}
+        serials, self.serials = self.serials, {}
+        statements = program.children
+        ids = []
+        ends = []
+        for index, statement in enumerate(statements, 1):
+            children = statement.children
+            key = id(children)
+            entry = serials.get(key)
+            if entry is None or entry[0] is not children:
+                entry = (children, self.serial)
+                self.serial += 1
+            self.serials[key] = entry
+            ids.append(key)
+            if entry[1] % CHUNK == CHUNK - 1:
+                ends.append(index)
+        starts = [statement.start for statement in statements]
+        # lines[i] -- the line statement i's counts from: the statement before it, or the program for the first
+        lines = list(accumulate((start >> COLUMN_BITS for start in starts), initial=program.start >> COLUMN_BITS))
+        if statements and (not ends or ends[-1] != len(statements)):
+            ends.append(len(statements))
+        begin = 0
+        for end in ends:
+            key = (tuple(ids[begin:end]), tuple(starts[begin:end]))
+            line = lines[begin]
+            summary = chunks.get(key)
+            if summary is not None and self.replay(summary, line):
+                self.reused += end - begin
+            else:
+                chunk = statements[begin:end]
+                recording = self.record(line)
+                self.runner.run(chunk, line)
+                summary = self.summary(tuple(statement.children for statement in chunk), recording)
+            self.chunks[key] = summary # holds the children, so their ids are not reused while the key is in use
+            begin = end
+
+    # visit through the statement's summary -- replayed if it fits, else the statement is analyzed and summarized
+    def summarized(self, visit):
+        def summarized_visit(statement: ASTNode):
+            summary = self.summaries.get(id(statement.children))
+            if summary is not None and summary.children is statement.children and self.replay(summary, self.runner.line):
+                self.reused += 1
+                return None
+            self.analyzed += 1
+            begin = self.record(self.runner.line)
+            lists = visit(statement)
+            if lists is None:
+                self.summarize(statement, begin)
+                return None
+            return self.summarized_body(statement, lists, begin)
+        return summarized_visit
+
+    # the statement lists of an if or loop, then its summary
+    def summarized_body(self, statement: ASTNode, lists, begin):
+        yield from lists
+        self.summarize(statement, begin)
+
+    def summarize(self, statement: ASTNode, begin) -> None:
+        self.summaries[id(statement.children)] = self.summary(statement.children, begin)
+        self.created += 1
+
+    # start recording what the code starting at line does -- (lookups so far, warnings so far, line)
+    def record(self, line: int):
+        self.symbol_table.recording += 1
+        return len(self.symbol_table.lookups), len(self.diagnostics), line
+
+    # what was done since begin, from record()
+    def summary(self, children, begin) -> Summary:
+        lookups, warnings, line = begin
+        table = self.symbol_table
+        first = {} # name -> (symbol, assignments, usages) when it was first looked up
+        for name, symbol, assignments, usages in table.lookups[lookups:]:
+            if name not in first:
+                first[name] = (symbol, assignments, usages)
+        inputs, counts, new = [], [], 0
+        for name, (symbol, assignments, usages) in first.items():
+            if symbol is None:
+                inputs.append((name, None))
+                new += name in table # defined, and not in a loop scope that was left
+            else:
+                inputs.append((name, (symbol.type, usages == 0)))
+                if symbol.assignment_count != assignments or symbol.usage_count != usages:
+                    counts.append((name, symbol.assignment_count - assignments, symbol.usage_count - usages))
+        defined = []
+        for name in islice(reversed(table.symbols), new): # the names defined are the last ones in the table
+            symbol = table.symbols[name]
+            position_line, column = symbol.position
+            defined.append((name, symbol.type, symbol.assignment_count, symbol.usage_count, (position_line - line, column)))
+        defined.reverse()
+        table.recording -= 1
+        if not table.recording:
+            del table.lookups[lookups:] # nothing around this needs them
+        return Summary(children, tuple(inputs), tuple(counts), tuple(defined),
+                       tuple((d.code, d.variable, d.line - line, d.column) for d in self.diagnostics.found[warnings:]))
+
+    # apply a summary to the code starting at line -- False (and nothing changed) if its input is not the same
+    def replay(self, summary: Summary, line: int) -> bool:
+        table = self.symbol_table
+        for name, state in summary.inputs:
+            symbol = table.get(name) # logged -- code around this one read it too
+            if (None if symbol is None else (symbol.type, symbol.usage_count == 0)) != state:
+                return False
+        symbols = table.symbols
+        for name, assignments, usages in summary.counts:
+            symbol = symbols[name]
+            symbol.assignment_count += assignments
+            symbol.usage_count += usages
+        for name, type, assignments, usages, (position_line, column) in summary.defined:
+            table.define(name, Symbol(type, assignments, usages, (line + position_line, column)))
+        for code, variable, warning_line, column in summary.warnings:
+            self.diagnostics.add(Diagnostic(code, variable, line + warning_line, column))
+        return True
+
+    # keep only the summaries of statements in the program
+    def sweep(self, root: ASTNode) -> None:
+        summaries, kept = self.summaries, {}
+        lists = [root.children]
+        while lists:
+            for statement in lists.pop():
+                key = id(statement.children)
+                summary = summaries.get(key)
+                if summary is not None and summary.children is statement.children:
+                    kept[key] = summary
+                if statement.kind == NodeKind.If:
+                    lists.append(statement.children[1:])
+                elif statement.kind == NodeKind.Loop:
+                    lists.append(statement.children[3:])
+        self.summaries = kept
+        self.kept, self.created = len(kept), 0
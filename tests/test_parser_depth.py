@@ -0,0 +1,48 @@
+from lexer import Lexer
+from parser import Parser
+from AST_Tree import ASTParser
+
+
+# inputs that grow with program length rather than nesting -- far past Python's recursion limit, small enough for CI
+STATEMENTS = 100_000
+OPERANDS = 20_000
+SIGNS = 20_000
+
+
+# parse in validate mode, then in build mode -- returns the tree
+def parse_both(source):
+    assert Parser(Lexer(source).get_tokens(), source).parse() == "Parsing completed successfully"
+    return ASTParser(Lexer(source).get_tokens(), source).parse()
+
+
+def test_flat_statement_list():
+    source = "program\n" + "x = 1;\n" * STATEMENTS + "end_program\n"
+    tree = parse_both(source)
+    assert len(tree.children) == STATEMENTS
+    assert all(node.value == "=" for node in tree.children)
+
+
+def test_long_logical_chain():
+    chain = "".join(f"x > {i} {'&&' if i % 2 else '||'} " for i in range(OPERANDS - 1)) + "x > 0"
+    source = f"program\nx = 1;\nif ({chain})\nprint(x);\nend_if\nend_program\n"
+    tree = parse_both(source)
+    # the chain folds to the right: one && / || on each step down its right side
+    node = tree.children[1].children[0] # the if's condition
+    ops = 0
+    while node.value in ("&&", "||"):
+        node = node.children[1]
+        ops += 1
+    assert ops == OPERANDS - 1
+    assert node.value == ">"
+
+
+def test_deep_unary_minus():
+    source = "program\nx = 1;\ny = " + "-" * SIGNS + "x;\nend_program\n"
+    tree = parse_both(source)
+    node = tree.children[1].children[1] # the assigned expression
+    signs = 0
+    while node.value == "-" and len(node.children) == 1:
+        node = node.children[0]
+        signs += 1
+    assert signs == SIGNS
+    assert node.value == "x"
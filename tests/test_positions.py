@@ -0,0 +1,31 @@
+from lexer import Lexer
+from parser import COLUMN_MASK
+from AST_Tree import ASTParser, unpack
+from Interpreter import Interpreter
+
+
+# build the AST -- and run it, for the error it stops on
+def parse(source):
+    return ASTParser(Lexer(source).get_tokens(), source).parse()
+
+
+def run_error(tree):
+    interpreter = Interpreter()
+    status, _, _ = interpreter.interpret(tree)
+    assert status.startswith("fail")
+    return interpreter.error
+
+
+def test_error_position():
+    error = run_error(parse("program x = 1;\n  print(y); end_program"))
+    assert (error.line, error.column) == (2, 9)
+
+
+def test_column_too_large_to_pack():
+    # a column past COLUMN_MASK is left unknown, it must not spill into the line
+    tree = parse("program x = 1;" + " " * (COLUMN_MASK + 1) + "print(y); end_program")
+    statement = tree.children[1]
+    assert unpack(statement.start) == (0, 0)
+    assert unpack(statement.end) == (0, 0)
+    error = run_error(tree)
+    assert (error.line, error.column) == (1, None)
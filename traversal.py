@@ -0,0 +1,176 @@
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple
+from parser import COLUMN_BITS
+# cSpell:ignore preorder postorder
+
+# tree walks that keep their own stack instead of recursing -- nesting depth is limited by memory, not by the
+# Python stack. They work on ASTNodes and on arena cursors alike
+
+RECURSION_DEPTH = 64 # expression levels evaluated by recursion, see Evaluator
+EXIT = object() # marks a node whose children are done, on the postorder() and Evaluator.stacked() stacks
+
+
+# every node before its children -- (node, depth, last) where last is True for the last child of its parent
+def preorder(root) -> Iterator[Tuple[Any, int, bool]]:
+    stack = [(root, 0, True)]
+    while stack:
+        node, depth, last = stack.pop()
+        yield node, depth, last
+        children = node.children
+        if children:
+            stack.append((children[-1], depth + 1, True))
+            stack.extend((child, depth + 1, False) for child in reversed(children[:-1]))
+
+# every node after its children
+def postorder(root) -> Iterator[Any]:
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is EXIT:
+            yield stack.pop()
+        elif node.children:
+            stack.append(node)
+            stack.append(EXIT)
+            stack.extend(reversed(node.children))
+        else:
+            yield node
+
+# computes the values of expressions bottom-up: operators[kind](node, *values of its children), for every kind an
+# expression can hold. A kind whose operator is missing gets missing(node) instead, in place of its whole subtree.
+# The first `depth` levels of an expression recurse (a call per node is cheaper than stack bookkeeping, and most
+# expressions are shallow); a subtree below that is walked with an explicit stack, its values kept on a value stack --
+# so depth costs memory, not Python stack
+class Evaluator:
+    def __init__(self, operators: Dict[Any, Callable], missing: Optional[Callable] = None, depth: int = RECURSION_DEPTH):
+        self.operators = operators
+        self.missing = missing
+        self.depth = depth
+        self.evaluate = self.recursion() # evaluate(root) -- the value of an expression
+
+    # the evaluating function: value(node, depth) for a node with depth levels left to recurse. A closure, so the
+    # recursion reads its tables from cells rather than from self
+    def recursion(self) -> Callable[..., Any]:
+        operators, missing, stacked = self.operators, self.missing, self.stacked
+
+        def value(node, depth: int = self.depth) -> Any:
+            operator = operators[node.kind]
+            children = node.children
+            if not children:
+                return operator(node) # a leaf
+            if depth and operator is not missing:
+                depth -= 1
+                if len(children) == 2:
+                    return operator(node, value(children[0], depth), value(children[1], depth))
+                values = [] # a loop, not a comprehension -- that would make depth a cell variable
+                for child in children:
+                    values.append(value(child, depth))
+                return operator(node, *values)
+            return stacked(node) # too deep to recurse, or missing
+        return value
+
+    # the value of a subtree, without recursion -- a node is pushed again under EXIT, and when EXIT comes
+    # back off the stack the values of its children are on top of the value stack
+    def stacked(self, root) -> Any:
+        operators, missing = self.operators, self.missing
+        values: List[Any] = []
+        push, pop = values.append, values.pop
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node is EXIT:
+                node = stack.pop()
+                operator = operators[node.kind]
+                count = len(node.children)
+                if count == 2:
+                    right = pop()
+                    values[-1] = operator(node, values[-1], right)
+                elif count == 1:
+                    values[-1] = operator(node, values[-1])
+                else:
+                    arguments = values[-count:]
+                    del values[-count:]
+                    push(operator(node, *arguments))
+                continue
+            operator = operators[node.kind]
+            children = node.children
+            if not children or operator is missing:
+                push(operator(node)) # a leaf
+                continue
+            stack.append(node)
+            stack.append(EXIT)
+            stack.extend(reversed(children))
+        return values[0]
+
+
+# runs statements without recursion -- visitors[kind](statement) returns None, or an iterable of statement lists
+# to run inside it (an if gives its body once, a loop once per iteration). The iterable is resumed after each list,
+# so a generator can do work when its body is done. self.line is the line of the statement running now (absolute,
+# statement lines are relative to the statement before -- see ASTNode), still the failing one when a visitor raises
+class StatementRunner:
+    def __init__(self, visitors: Dict[Any, Callable[[Any], Optional[Iterable[Sequence]]]]):
+        self.visitors = visitors
+        self.line = 0
+
+    # run a statement list -- its first statement's line counts from line
+    def run(self, statements: Sequence, line: int = 0) -> None:
+        visitors = self.visitors
+        # the lists being run further out: (lists, statements, next index, line, owner line) each, innermost last
+        frames: List[Tuple[Iterator[Sequence], Sequence, int, int, int]] = []
+        lists: Iterator[Sequence] = iter((statements,)) # the lists of the statement owning the current one
+        owner = line # the line of that statement
+        statements, index, count = (), 0, 0
+        while True:
+            if index < count:
+                statement = statements[index]
+                index += 1
+                line += statement.start >> COLUMN_BITS
+                self.line = line
+                nested = visitors[statement.kind](statement)
+                # statement lists of its own -- run them, then carry on after it
+                if nested is not None:
+                    frames.append((lists, statements, index, line, owner))
+                    lists, owner = iter(nested), line
+                    statements, index, count = (), 0, 0
+                continue
+            # this list is done -- the next repetition, or back to the statement owning it
+            self.line = owner
+            statements = next(lists, None)
+            if statements is not None:
+                index, count, line = 0, len(statements), owner
+                continue
+            if not frames:
+                return
+            lists, statements, index, line, owner = frames.pop()
+            count = len(statements)
+
+
+# drives generators that call each other without nesting them: a generator yields a node to have it run
+# (start(node) makes its generator, and its return value is sent back), and yields an instance of output to pass
+# it out. Exceptions travel up the chain like they would through yield from
+def trampoline(root, start: Callable[[Any], Generator], output: type = str) -> Generator[Any, None, Any]:
+    stack = [start(root)]
+    value: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        generator = stack[-1]
+        try:
+            item = generator.send(value) if error is None else generator.throw(error)
+        # finished -- its result goes to the one that yielded its node
+        except StopIteration as stop:
+            stack.pop()
+            if not stack:
+                return stop.value
+            value, error = stop.value, None
+            continue
+        except Exception as e:
+            stack.pop()
+            if not stack:
+                raise
+            value, error = None, e
+            continue
+        error = None
+        if isinstance(item, output):
+            yield item
+            value = None
+        else:
+            stack.append(start(item))
+            value = None